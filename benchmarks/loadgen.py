@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from structures import snapshot
+from structures.game import Action, Status
+from structures.protocol import (INPUT, JOIN, UPDATE, WELCOME, DeltaDecoder, Message, encode, read_message)
+
+class Stats:
+    def __init__(self):
+        self.updates = 0
+        self.bytes = 0
+        self.games = 0
+        # ms between consecutive updates seen by one client
+        self.gaps: list[float] = []
+
+async def _client(host: str, port: int, session: int, rate: float, stats: Stats, rng: random.Random):
+    # Plays one player of a session with random inputs; when the game ends it
+    # joins the session's next game, so the server always has every session running
+    generation = 0
+    while True:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(encode(Message.JOIN, JOIN.pack(1) + f"load-{session}.{generation}".encode()))
+        message, payload = await read_message(reader)
+        if message is not Message.WELCOME:
+            raise RuntimeError(payload.decode())
+        decoder = DeltaDecoder(zlib.decompress(payload[WELCOME.size:]))
+
+        async def send():
+            while True:
+                await asyncio.sleep(rng.expovariate(rate))
+                writer.write(encode(Message.INPUT, INPUT.pack(0, rng.choice(list(Action)).value)))
+
+        sender = asyncio.create_task(send())
+        last = None
+        try:
+            while True:
+                message, payload = await read_message(reader)
+                if message is not Message.UPDATE:
+                    continue
+                now = time.perf_counter()
+                if last is not None:
+                    stats.gaps.append((now - last) * 1e3)
+                last = now
+                stats.updates += 1
+                stats.bytes += len(payload)
+                _, kind = UPDATE.unpack_from(payload)
+                data = decoder.decode(kind, payload[UPDATE.size:])
+                if snapshot.HEADER.unpack_from(data)[11] != Status.PLAYING.value:
+                    stats.games += 1
+                    break
+        finally:
+            sender.cancel()
+            writer.close()
+        generation += 1
+
+async def _server_stats(host: str, port: int) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode(Message.STATS))
+    _, payload = await read_message(reader)
+    writer.close()
+    return json.loads(payload)
+
+async def _load(host: str, port: int, sessions: int, clients: int, rate: float, duration: float, seed: int) -> dict:
+    stats = Stats()
+    rng = random.Random(seed)
+    tasks = [asyncio.create_task(_client(host, port, session, rate, stats, random.Random(rng.random())))
+             for session in range(sessions) for _ in range(clients)]
+    # Connecting everyone takes a moment; only the steady state is measured
+    await asyncio.sleep(1)
+    before = await _server_stats(host, port)
+    updates, sent = stats.updates, stats.bytes
+    stats.gaps.clear()
+    await asyncio.sleep(duration)
+    after = await _server_stats(host, port)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    gaps = sorted(stats.gaps) or [0]
+    cpu = (after["cpu_seconds"] - before["cpu_seconds"]) / (after["uptime"] - before["uptime"])
+    return {
+        "sessions": sessions,
+        "clients": sessions * clients,
+        "server_cpu": cpu,
+        "sessions_per_core": sessions / cpu if cpu else None,
+        "tick_ms": after["tick_ms"],
+        "dropped_ticks": after["dropped_ticks"] - before["dropped_ticks"],
+        "updates_per_client_s": (stats.updates - updates) / duration / (sessions * clients),
+        "kb_per_client_s": (stats.bytes - sent) / duration / (sessions * clients) / 1e3,
+        "update_gap_ms": {"p50": statistics.median(gaps), "p99": gaps[min(len(gaps) - 1, len(gaps) * 99 // 100)]},
+        "games_finished": stats.games,
+    }
+
+def _start_server(port: int, arguments: list[str]) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "structures.server", "--port", str(port), *arguments])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a game server over loopback and report tick times and sessions per core")
+    parser.add_argument("-s", "--sessions", default="1,10,50,100", help="comma-separated session counts to try")
+    parser.add_argument("-c", "--clients", type=int, default=2, help="clients per session, one player each")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="seconds measured per session count")
+    parser.add_argument("--rate", type=float, default=4, help="inputs per second per client")
+    parser.add_argument("--port", type=int, default=7787)
+    parser.add_argument("--connect", action="store_true", help="load an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    args, server_arguments = parser.parse_known_args()
+
+    results = []
+    for sessions in map(int, args.sessions.split(",")):
+        # A fresh server per step, so its CPU and tick figures cover only this load
+        server = None if args.connect else _start_server(args.port, ["--players", str(args.clients), *server_arguments])
+        try:
+            result = asyncio.run(_load("127.0.0.1", args.port, sessions, args.clients, args.rate, args.duration, args.seed))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+        results.append(result)
+        tick = result["tick_ms"]
+        print(f"{sessions:5} sessions: cpu {result['server_cpu']:6.1%}, {result['sessions_per_core'] or 0:7.0f} sessions/core, "
+              f"tick p50 {tick.get('p50', 0):.3f} p99 {tick.get('p99', 0):.3f} max {tick.get('max', 0):.3f} ms, "
+              f"{result['dropped_ticks']} dropped, {result['kb_per_client_s']:.2f} kB/s per client, "
+              f"update gap p99 {result['update_gap_ms']['p99']:.1f} ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"results": results}, file, indent=2)
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+from functools import cache, partial
+from typing import Callable, Iterator
+
+# Rendering benchmarks run without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+import pygame
+
+import main
+from structures.batch import NO_ACTION, BatchEnv
+from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
+from structures.cell import Cell
+from structures.direction import Direction
+from structures.enemy import COOLDOWN, Enemy
+from structures.fog import FogLayer
+from structures.game import MAX_OXYGEN, Action, GameState, Status, new_game, schedule_timers, step
+from structures.generator import generate_level
+from structures.level import Level
+from structures.paths import FlowField
+from structures.pawn import Pawn
+from structures.player import Player
+from structures.scene import Scene
+from structures import snapshot
+
+LOGIC_SIZES = (15, 32, 64, 256)
+# Render benchmarks allocate board-sized surfaces, so they stay on smaller boards
+# 256 is far larger than the viewport, where drawing should cost about what 32 does
+RENDER_SIZES = (15, 32, 256)
+PAWN_COUNTS = (2, 8, 32)
+# Games per BatchEnv; the batch needs a path table, so it runs on the built-in level only
+BATCH_SIZES = (256, 4096)
+ENEMY_COUNTS = (1, 8, 32)
+# Boards only the flow field is timed on, where the per-enemy cases would take minutes
+FLOW_SIZES = (1000,)
+
+@cache
+def _level(size: int) -> Level:
+    return generate_level(size, size, seed=size)
+
+def _board(size: int) -> Board:
+    if size == BOARD_WIDTH:
+        return Board(BOARD_HEIGHT, BOARD_WIDTH, None)
+    return Board.from_level(_level(size))
+
+@cache
+def _shared_board(size: int) -> Board:
+    # One board per size for the cases that do not need one of their own
+    return _board(size)
+
+def _spread(board: Board, count: int, rng: random.Random) -> list[tuple[int, int]]:
+    cells = rng.sample(range(board.width * board.height), count)
+    return [board.id_to_cartesian(id) for id in cells]
+
+def _time(function, repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(function)
+    loops, _ = timer.autorange()
+    loops = max(1, int(loops * min_time / 0.2))
+    samples = [total / loops * 1e6 for total in timer.repeat(repeat, loops)]
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "mean_us": statistics.fmean(samples),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+# A case is a name and a setup that returns the function to time. Only the
+# selected cases are set up, each with a random generator seeded by its
+# name, so its fixtures are the same whichever other cases run.
+Case = tuple[str, Callable[[random.Random], Callable[[], object]]]
+
+def _construct(size: int, rng: random.Random):
+    level = _level(size)
+    return lambda: Board.from_level(level)
+
+def _wall_images(size: int, rng: random.Random):
+    board = _shared_board(size)
+    return lambda: [main.assets.get(Cell.get_wall_image(walls)) for walls in board.walls]
+
+def _moving_pawns(size: int, count: int, rng: random.Random) -> tuple[Board, list[Pawn]]:
+    # Pawns live in the board's occupancy, so each case gets a board of its own
+    board = _board(size)
+    pawns = [Pawn(x, y, "BLUE") for x, y in _spread(board, count, rng)]
+    for pawn in pawns:
+        board.occupy(board.cartesian_to_id(pawn.x, pawn.y))
+    return board, pawns
+
+def _pawn_move(size: int, count: int, rng: random.Random):
+    board, pawns = _moving_pawns(size, count, rng)
+    def move_pawn():
+        pawn = pawns[0]
+        for direction in Direction:
+            pawn.move(direction, board)
+    return move_pawn
+
+def _player_move(size: int, count: int, rng: random.Random):
+    board, pawns = _moving_pawns(size, count, rng)
+    player = Player(0, pawns, set(Direction))
+    def move_player():
+        for direction in Direction:
+            player.move(direction, board)
+    return move_player
+
+def _enemy_move(size: int, count: int, use_flow: bool, rng: random.Random):
+    board = _shared_board(size)
+    positions = _spread(board, count + 2, rng)
+    pawns = [Pawn(x, y, "BLUE") for x, y in positions[:2]]
+    enemies = [Enemy(x, y, True, 0) for x, y in positions[2:]]
+    flow = FlowField(board) if use_flow else None
+    def move_enemies():
+        # Pawns stand still, so a flow field is built once and then only read
+        if flow is not None:
+            flow.update(board.cartesian_to_id(pawn.x, pawn.y) for pawn in pawns)
+        for enemy, (x, y) in zip(enemies, positions[2:]):
+            enemy.x, enemy.y = x, y
+            enemy.move(board, pawns, flow)
+    return move_enemies
+
+def _flow_build(size: int, rng: random.Random):
+    board = _shared_board(size)
+    flow = FlowField(board)
+    targets = [[board.cartesian_to_id(x, y) for x, y in _spread(board, 2, rng)] for _ in range(8)]
+    def build_flow():
+        for cells in targets:
+            flow.update(cells)
+    return build_flow
+
+def _game_step(size: int, rng: random.Random):
+    board = _shared_board(size)
+    states = [new_game(board)]
+    actions = [(0, Action.NORTH), (1, Action.EAST), (0, Action.SOUTH), (1, Action.WEST)]
+    def run_step():
+        # A finished game ignores step(), so start over whenever one ends
+        if states[0].status is not Status.PLAYING:
+            states[0] = new_game(board)
+        for action in actions:
+            step(states[0], [action], 16)
+    return run_step
+
+def _chase(size: int, count: int, rng: random.Random):
+    board = _shared_board(size)
+    positions = _spread(board, count, rng)
+    phases = [rng.randrange(COOLDOWN) for _ in positions]
+    def chased_game():
+        # Awake enemies moving out of step with each other, as spawner waves leave them
+        state = new_game(board)
+        state.enemies += [Enemy(x, y, True, phase - COOLDOWN) for (x, y), phase in zip(positions, phases)]
+        schedule_timers(state)
+        return state
+    states = [chased_game()]
+    def run_chase():
+        if states[0].status is not Status.PLAYING:
+            states[0] = chased_game()
+        for _ in range(4):
+            step(states[0], [], 16)
+    return run_chase
+
+def _snapshot(size: int, restore: bool, rng: random.Random):
+    state = new_game(_board(size))
+    state.enemies += [Enemy(x, y, True, 0) for x, y in _spread(state.board, 8, rng)]
+    buffer = bytearray(snapshot.size(state))
+    snapshot.save_into(state, buffer)
+    if restore:
+        return lambda: snapshot.restore(state, buffer)
+    return lambda: snapshot.save_into(state, buffer)
+
+def _batch_step(count: int, rng: random.Random):
+    env = BatchEnv(_shared_board(BOARD_WIDTH), count)
+    actions = np.random.default_rng(count).integers(NO_ACTION, len(Action), (16, count, env.player_count), np.int8)
+    def step_batch():
+        # 16 steps of every game, restarting the finished ones
+        for step_actions in actions:
+            env.step(step_actions, 16)
+            env.reset(env.done)
+    return step_batch
+
+def _logic_cases() -> Iterator[Case]:
+    for size in LOGIC_SIZES:
+        if size == BOARD_WIDTH:
+            yield "board.construct[default]", lambda rng: lambda: Board(BOARD_HEIGHT, BOARD_WIDTH, None)
+        yield f"board.construct[{size}]", partial(_construct, size)
+        yield f"cell.get_wall_image[{size}]", partial(_wall_images, size)
+        for count in PAWN_COUNTS:
+            yield f"pawn.move[{size},pawns={count}]", partial(_pawn_move, size, count)
+            yield f"player.move[{size},pawns={count}]", partial(_player_move, size, count)
+        for count in ENEMY_COUNTS:
+            yield f"enemy.move[{size},enemies={count}]", partial(_enemy_move, size, count, False)
+            yield f"enemy.move_flow[{size},enemies={count}]", partial(_enemy_move, size, count, True)
+        yield f"flow_field.build[{size}]", partial(_flow_build, size)
+        yield f"game.step[{size}]", partial(_game_step, size)
+        for count in ENEMY_COUNTS:
+            yield f"game.step[{size},enemies={count}]", partial(_chase, size, count)
+        yield f"snapshot.save[{size}]", partial(_snapshot, size, False)
+        yield f"snapshot.restore[{size}]", partial(_snapshot, size, True)
+        if size == BOARD_WIDTH:
+            for count in BATCH_SIZES:
+                yield f"batch.step[{size},games={count}]", partial(_batch_step, count)
+    for size in FLOW_SIZES:
+        yield f"flow_field.build[{size}]", partial(_flow_build, size)
+
+@cache
+def _view(size: int) -> tuple[Board, Scene, GameState, FogLayer]:
+    # The board, scene, game and fog layer the render cases of one size share
+    board = _board(size)
+    return board, Scene(board, main._create_camera(board)), new_game(board), FogLayer(board.width, board.height)
+
+def _decal() -> pygame.Surface:
+    return main.assets.get("assets/decals/dosomething.png").copy()
+
+def _render_walls(size: int, rng: random.Random):
+    return _view(size)[1]._render_walls
+
+def _draw_board(screen, size: int, rng: random.Random):
+    board, scene, _, _ = _view(size)
+    return lambda: main._draw_board(screen, scene, board, "assets/objectives/exit.png")
+
+def _draw_enemy(screen, size: int, rng: random.Random):
+    _, scene, state, _ = _view(size)
+    return lambda: main._draw_enemy(screen, scene.camera, state.enemies[0])
+
+def _draw_pawns(screen, size: int, count: int, rng: random.Random):
+    board, scene, _, _ = _view(size)
+    pawns = [Pawn(x, y, rng.choice(("BLUE", "RED"))) for x, y in _spread(board, count, rng)]
+    return lambda: main._draw_pawns(screen, scene.camera, pawns)
+
+def _draw_oxygen_gauge(screen, size: int, rng: random.Random):
+    state = _view(size)[2]
+    oxygen_gauge = main._create_oxygen_gauge()
+    def draw_oxygen_gauge():
+        # Sweeps the whole range so most calls change the bar height
+        state.oxygen = (state.oxygen - 0.37) % MAX_OXYGEN
+        oxygen_gauge.draw(screen, oxygen_gauge.key(state.oxygen))
+    return draw_oxygen_gauge
+
+def _draw_player_indicators(screen, size: int, rng: random.Random):
+    state = _view(size)[2]
+    indicators = main._create_player_indicators(state.players)
+    def draw_player_indicators():
+        state.players[0].rotate_pawn()
+        for indicator, player in zip(indicators, state.players):
+            indicator.draw(screen, indicator.key(player))
+    return draw_player_indicators
+
+def _fog_update(size: int, rng: random.Random):
+    _, scene, state, fog_layer = _view(size)
+    return lambda: fog_layer.update(state.fog * rng.random(), scene.camera)
+
+def _draw_play_area(screen, size: int, rng: random.Random):
+    _, scene, state, fog_layer = _view(size)
+    decal = _decal()
+    return lambda: main._draw_play_area(screen, scene, state, fog_layer, decal)
+
+def _draw_frame(screen, size: int, mode: str, rng: random.Random):
+    board, scene, state, fog_layer = _view(size)
+    decal, oxygen_gauge = _decal(), main._create_oxygen_gauge()
+    states = [new_game(board)]
+    indicators = main._create_player_indicators(states[0].players)
+    def draw_frame():
+        main.RENDER_MODE = mode
+        if states[0].status is not Status.PLAYING:
+            states[0] = new_game(board)
+        step(states[0], [], 16)
+        main._draw_frame(screen, scene, states[0], [], fog_layer, decal, oxygen_gauge, indicators)
+    return draw_frame
+
+def _render_cases(screen) -> Iterator[Case]:
+    for size in RENDER_SIZES:
+        yield f"scene.render_walls[{size}]", partial(_render_walls, size)
+        yield f"draw.board[{size}]", partial(_draw_board, screen, size)
+        yield f"draw.enemy[{size}]", partial(_draw_enemy, screen, size)
+        for count in PAWN_COUNTS:
+            yield f"draw.pawns[{size},pawns={count}]", partial(_draw_pawns, screen, size, count)
+        yield f"draw.oxygen_gauge[{size}]", partial(_draw_oxygen_gauge, screen, size)
+        yield f"draw.player_indicators[{size}]", partial(_draw_player_indicators, screen, size)
+        yield f"draw.fog_update[{size}]", partial(_fog_update, size)
+        yield f"draw.play_area[{size}]", partial(_draw_play_area, screen, size)
+        for mode in ("dirty", "full"):
+            yield f"draw.frame[{size},{mode}]", partial(_draw_frame, screen, size, mode)
+
+def run(selected: str, repeat: int, min_time: float) -> dict:
+    pygame.init()
+    screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+    results = {}
+    for name, setup in [*_logic_cases(), *_render_cases(screen)]:
+        if selected and selected not in name:
+            continue
+        results[name] = _time(setup(random.Random(name)), repeat, min_time)
+        print(f"{name:45} {results[name]['median_us']:12.1f} us", flush=True)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "video_driver": os.environ["SDL_VIDEODRIVER"],
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    # Names whose median got slower than the baseline by more than threshold
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:45} {previous['median_us']:12.1f} -> {result['median_us']:12.1f} us  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the render and game-logic hot paths")
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("-b", "--baseline", help="compare against a previous JSON result")
+    parser.add_argument("-t", "--threshold", type=float, default=0.15, help="allowed slowdown before failing (0.15 = 15%%)")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per repeat")
+    args = parser.parse_args()
+
+    current = run(args.filter, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(current, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -1,21 +1,99 @@
+import cProfile
+import os
+import sys
+import time
+
 import pygame
 
+from structures.assets import assets
 from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
-from structures.cell import Cell, Objective
+from structures.camera import Camera
+from structures.cell import WALL_IMAGES, Objective
+from structures.controls import Controls
 from structures.direction import Direction
-from structures.enemy import Enemy
-from structures.pawn import Pawn
+from structures.fog import FogLayer
+from structures.game import Status, check_counts, new_game, step
+from structures.hotreload import LevelWatcher, apply_diff, diff_levels
+from structures.hud import INDICATOR_HEIGHT, OxygenGauge, PlayerIndicator, fonts
+from structures.level import Level, LevelError
 from structures.player import Player
+from structures.profiler import StartupTimer, profiler
+from structures.protocol import DEFAULT_PORT, Client
+from structures.replay import Recorder, Replay
+from structures.scene import Scene
+from structures import snapshot
+from structures.timestep import DEFAULT_TICK_RATE, FixedTimestep, capture, interpolate
+
+startup = StartupTimer()
+startup.mark("imports")
 
 # Initialize Pygame
 pygame.init()
 pygame.joystick.init()
+startup.mark("pygame init")
 
 # Constants
 SCREEN_WIDTH = 1100
 SCREEN_HEIGHT = 900  # Increased height for timer display
+# The HUD takes this much of the right edge; the play area gets the rest of the window
+SIDEBAR_WIDTH = 200
 CELL_SIZE = 60
-NUM_TILES = 5
+DECAL_POSITION = (250, 250)
+
+# "dirty" pushes only the changed rectangles each frame, "full" redraws and flips the whole screen
+RENDER_MODE = os.environ.get("MINER_RENDER_MODE", "dirty")
+# Every session is recorded into this directory when it is set
+RECORD_DIR = os.environ.get("MINER_RECORD_DIR")
+# Plays back a recorded session instead of reading the keyboard and joysticks
+REPLAY_FILE = os.environ.get("MINER_REPLAY")
+# Shows rolling per-phase frame times in the top-left corner
+PROFILE_OVERLAY = os.environ.get("MINER_PROFILE_OVERLAY") == "1"
+# Per-phase frame times (frames.json) and a Chrome trace (trace.json) are written here on exit
+TRACE_DIR = os.environ.get("MINER_TRACE_DIR")
+# Runs the game loop under cProfile and dumps the stats to this file
+CPROFILE_FILE = os.environ.get("MINER_CPROFILE")
+# Game rules advance in fixed ticks at TICK_RATE per second; frames are drawn at up to FRAME_RATE
+TICK_RATE = int(os.environ.get("MINER_TICK_RATE", DEFAULT_TICK_RATE))
+FRAME_RATE = int(os.environ.get("MINER_FRAME_RATE", 60))
+# Players share the pawns; each player steers along one axis, alternating N/S and W/E
+PLAYER_COUNT = int(os.environ.get("MINER_PLAYERS", 2))
+PAWN_COUNT = int(os.environ.get("MINER_PAWNS", 2))
+# Blends oxygen, fog and the signal decal between the last two ticks when drawing
+INTERPOLATE = os.environ.get("MINER_INTERPOLATE") == "1"
+# Prints how long each startup stage took, from process start to the first frame
+STARTUP_REPORT = os.environ.get("MINER_STARTUP_REPORT") == "1"
+# The game is saved here every SNAPSHOT_INTERVAL ms of game time, and resumed from it
+# on the next start if the previous session did not finish
+SNAPSHOT_FILE = os.environ.get("MINER_SNAPSHOT")
+SNAPSHOT_INTERVAL = 1000
+# Puts the level back to how it started
+RESTART_KEY = pygame.K_BACKSPACE
+# Camera zoom; the mouse wheel zooms too
+ZOOM_IN_KEYS = (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS)
+ZOOM_OUT_KEYS = (pygame.K_MINUS, pygame.K_KP_MINUS)
+# Joins a session on a game server (python -m structures.server) at host:port as a thin
+# client: the server runs the rules, and this process only sends inputs and draws.
+# The local players take the next free player slots of the session.
+SERVER = os.environ.get("MINER_SERVER")
+SESSION = os.environ.get("MINER_SESSION", "default")
+# Level development: edits saved to the level file given on the command line are applied
+# to the running game cell by cell, and a change of size starts the level over
+HOT_RELOAD = os.environ.get("MINER_HOT_RELOAD") == "1"
+
+# Decoded on a thread pool while the window opens
+IMAGES = [
+    *WALL_IMAGES,
+    "assets/objectives/exit.png",
+    "assets/objectives/exit_cover.png",
+    "assets/objectives/pressure_plate.png",
+    "assets/objectives/oxygen.png",
+    "assets/pawns/miner1.png",
+    "assets/pawns/miner2.png",
+    "assets/pawns/major.png",
+    "assets/decals/dosomething.png",
+    "assets/decals/up_down.png",
+    "assets/decals/left_right.png",
+]
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -32,252 +110,365 @@ def _create_board(filename: str) -> Board:
     board = Board(BOARD_HEIGHT, BOARD_WIDTH, filename) 
     return board 
 
-def _create_transparencies():
-    transparency_surfaces = []
-    transparencies = []
-    for _ in range(NUM_TILES * NUM_TILES):
-        transparencies.append(255)
-    for row in range(NUM_TILES):
-        for col in range(NUM_TILES):
-            width = SCREEN_WIDTH - 200
-            transparency_surface = pygame.Surface((width // NUM_TILES, SCREEN_HEIGHT // NUM_TILES), pygame.SRCALPHA)
-            transparency_surface.fill((0, 0, 0, 255))  # rgpA, A = 0 is transparent, A = 255 is opaque
-            transparency_surface.scroll(row * width // NUM_TILES, col * SCREEN_HEIGHT // NUM_TILES)
-            pygame.display.flip()
-            transparency_surfaces.append(transparency_surface)
-    return transparency_surfaces, transparencies
-
-def _create_oxygen_panel():
-    oxygen_image_view = pygame.Surface((100, SCREEN_WIDTH - 200))
-    oxygen_image_view.fill(GRAY)
-    pygame.draw.rect(oxygen_image_view, DARK_BROWN, (SCREEN_WIDTH - 200, 0, 100, 10))
-    scale_image_view = pygame.Surface((100, 1000))
-    return oxygen_image_view, scale_image_view
-
-def _create_player_indicators(screen, startx, starty, player_text):
-    player_indicator_surface = pygame.Surface((100, 450))
-    player_indicator_surface.fill(GRAY)
-    pygame.draw.rect(player_indicator_surface, RED, (startx, starty, 100, 450))
-    font = pygame.font.SysFont('Arial', 25)
-    screen.blit(font.render(player_text, True, (255,0,0)), (200, 100))
-    return player_indicator_surface
+def _level_start(board: Board, level: Level, player_count: int, pawn_count: int) -> bytes:
+    # A snapshot of level as it starts, for the restart key. The walls are
+    # already the live board's, so a copy shares its paths.
+    board = board.copy()
+    board.objectives[:] = level.objectives
+    board.reindex()
+    return snapshot.save(new_game(board, player_count, pawn_count))
 
-# Draw board
-def _draw_board(screen, board, exit_image):
-    for x in range(BOARD_WIDTH):
-        for y in range(BOARD_HEIGHT):
-            image = Cell.get_wall_image(board.cells[Board.cartesian_to_id(x, y)].adjacency_matrix)
-            screen.blit(image, (x * CELL_SIZE, y *  CELL_SIZE))
-            # pygame.draw.rect(screen, GRAY, (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE), 2)
-            match board.cells[Board.cartesian_to_id(x, y)].objective:
-                case Objective.EXIT:
-                    shift = 10
-                    size_shift = 20
-                    exit_image = pygame.image.load(exit_image)
-                    screen.blit(exit_image, (x * CELL_SIZE + 5, y * CELL_SIZE + shift, CELL_SIZE - size_shift, CELL_SIZE - size_shift))
-                case Objective.PRESSURE_PLATE:
-                    shift = 10
-                    size_shift = 20
-                    PRESSURE_PLATE_IMAGE = pygame.image.load("assets/objectives/pressure_plate.png")
-                    screen.blit(PRESSURE_PLATE_IMAGE, (x * CELL_SIZE + shift, y * CELL_SIZE + shift + 10, CELL_SIZE, CELL_SIZE))
-                case Objective.OXYGEN_TANK:
-                    shift = 10
-                    size_shift = 20
-                    OXYGEN_IMAGE = pygame.image.load("assets/objectives/oxygen.png")
-                    screen.blit(OXYGEN_IMAGE, (x * CELL_SIZE + shift, y * CELL_SIZE + shift, CELL_SIZE - size_shift, CELL_SIZE - size_shift))
+def _create_camera(board: Board, width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT) -> Camera:
+    return Camera(pygame.Rect(0, 0, width - SIDEBAR_WIDTH, height), board.width, board.height, CELL_SIZE)
 
-def _draw_transparencies(screen, transparency_surfaces):
-    for i in range(len(transparency_surfaces)):
-        width = SCREEN_WIDTH - 200
-        (row, column) = divmod(i, NUM_TILES)
-        screen.blit(transparency_surfaces[i], (row * width // NUM_TILES, column * SCREEN_HEIGHT // NUM_TILES))
+def _create_oxygen_gauge(width: int = SCREEN_WIDTH, height: int = SCREEN_HEIGHT) -> OxygenGauge:
+    # The scale is taller than the screen and centred on it, so both ends are cut off
+    return OxygenGauge(pygame.Rect(width - 200, 0, 100, height),
+                       pygame.Rect(width - 200, height // 2 - 500, 100, 1000), DARK_BROWN, GREEN)
 
-def _draw_oxygen_panel(screen, oxygen_image_view, scale_image_view, oxygen):
-    scale_image_view.fill(DARK_BROWN)
-    height = oxygen * scale_image_view.get_height() // 100
-    y = scale_image_view.get_height() - height
-    pygame.draw.rect(scale_image_view, GREEN, (40, y, 20, height), 0, 3)
-        
-    screen.blit(oxygen_image_view, oxygen_image_view.get_rect(center = (950, 450)))
-    screen.blit(scale_image_view, scale_image_view.get_rect(center = (950, 450)))
+def _create_player_indicators(players: list[Player], width: int = SCREEN_WIDTH,
+                              height: int = SCREEN_HEIGHT) -> list[PlayerIndicator]:
+    # One panel per player, splitting the column evenly
+    pawn_images = ["assets/pawns/miner1.png", "assets/pawns/miner2.png"]
+    direction_images = {
+        frozenset({Direction.NORTH, Direction.SOUTH}): "assets/decals/up_down.png",
+        frozenset({Direction.EAST, Direction.WEST}): "assets/decals/left_right.png",
+    }
+    indicators = []
+    for index in range(len(players)):
+        top, bottom = height * index // len(players), height * (index + 1) // len(players)
+        scale = min(1, (bottom - top) / INDICATOR_HEIGHT)
+        label = fonts.render(f"P{index + 1}", "luxiserif", max(1, round(50 * scale)), WHITE)
+        indicators.append(PlayerIndicator(pygame.Rect(width - 100, top, 100, bottom - top), label, (25, round(10 * scale)),
+                                          pawn_images, direction_images))
+    return indicators
 
-def _draw_player_indicator(screen, player_indicator_surface, player, dx, dy):
-    match player.pawn_index:
-        case 0:
-            PLAYER_IMAGE = pygame.image.load("assets/pawns/miner1.png")
-        case 1:
-            PLAYER_IMAGE = pygame.image.load("assets/pawns/miner2.png")
-    
-    PLAYER_IMAGE = pygame.transform.scale_by(PLAYER_IMAGE, 2)
-    screen.blit(PLAYER_IMAGE, player_indicator_surface.get_rect(center = (dx + 15, dy + 185)))
-
-    if player.possible_movement == {Direction.NORTH, Direction.SOUTH}:
-        DIRECTION_IMAGE = pygame.image.load("assets/decals/up_down.png")
-    else:
-        DIRECTION_IMAGE = pygame.image.load("assets/decals/left_right.png")
-
-    DIRECTION_IMAGE = pygame.transform.scale_by(DIRECTION_IMAGE, 0.7)
-    screen.blit(DIRECTION_IMAGE, player_indicator_surface.get_rect(center = (dx + 5, dy + 225)))
-    font = pygame.font.SysFont('luxiserif', 50)
-    screen.blit(font.render("P1", True, WHITE), (1025, 10))
-    screen.blit(font.render("P2", True, WHITE), (1025, 510))
+# Draw board, restoring the cached wall layer and redrawing objectives only inside area.
+# Only cells inside the viewport are visited, and sprites come pre-scaled for the zoom.
+def _draw_board(screen, scene, board, exit_image, area=None):
+    camera = scene.camera
+    area = scene.rect if area is None else area.clip(scene.rect)
+    screen.blit(scene.background, area, area.move(-scene.rect.x, -scene.rect.y))
+    scale = camera.scale
+    for x, y in camera.cells_in(area):
+        match board.objective(board.cartesian_to_id(x, y)):
+            case Objective.EXIT:
+                left, top = camera.cell_rect(x, y).topleft
+                screen.blit(camera.sprite(exit_image), (left + 5 * scale, top + 10 * scale))
+            case Objective.PRESSURE_PLATE:
+                left, top = camera.cell_rect(x, y).topleft
+                screen.blit(camera.sprite("assets/objectives/pressure_plate.png"), (left + 10 * scale, top + 20 * scale))
+            case Objective.OXYGEN_TANK:
+                left, top = camera.cell_rect(x, y).topleft
+                screen.blit(camera.sprite("assets/objectives/oxygen.png"), (left + 10 * scale, top + 10 * scale))
 
 # Draw pawns
-def _draw_pawns(screen, pawns):
-    shift = 10
-    size_shift = 20
+def _draw_pawns(screen, camera, pawns):
+    shift = 10 * camera.scale
     for pawn in pawns:
+        rect = camera.cell_rect(pawn.x, pawn.y)
+        if not rect.colliderect(camera.viewport):
+            continue
         match pawn.color:
             case "BLUE":
-                PIC_IMAGE = pygame.image.load("assets/pawns/miner1.png")
+                PIC_IMAGE = camera.sprite("assets/pawns/miner1.png")
             case "RED":
-                PIC_IMAGE = pygame.image.load("assets/pawns/miner2.png")
-        screen.blit(PIC_IMAGE, ((pawn.x * CELL_SIZE) + shift, (pawn.y * CELL_SIZE) + shift, CELL_SIZE - size_shift, CELL_SIZE - size_shift))
+                PIC_IMAGE = camera.sprite("assets/pawns/miner2.png")
+        screen.blit(PIC_IMAGE, (rect.x + shift, rect.y + shift))
 
-def _draw_enemy(screen, enemy):
-    size_shift = 20
-    ENEMY_IMAGE = pygame.image.load("assets/pawns/major.png")
-    screen.blit(ENEMY_IMAGE, ((enemy.x * CELL_SIZE), (enemy.y * CELL_SIZE), CELL_SIZE - size_shift, CELL_SIZE - size_shift))
-    
-def main():
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("Miner Issues")
-    clock = pygame.time.Clock()
-    joy = None
+def _draw_enemy(screen, camera, enemy):
+    rect = camera.cell_rect(enemy.x, enemy.y)
+    if rect.colliderect(camera.viewport):
+        screen.blit(camera.sprite("assets/pawns/major.png"), rect)
 
-    board = _create_board(None)  # Gives access to access to all cells
-    transparency_surfaces, transparencies = _create_transparencies()
-    oxygen_image_view, scale_image_view = _create_oxygen_panel()
-    first_player_indicator_surface = _create_player_indicators(screen, 1000, 0, "Player 1")
-    second_player_indicator_surface = _create_player_indicators(screen, 1000, 450, "Player 2")
-    
-    do_something_image = pygame.image.load("assets/decals/dosomething.png").convert_alpha()
-    do_something_transparency = 0
-     
-    running = True
-    win = False
+def _draw_play_area(screen, scene, state, fog_layer, do_something_image, area=None):
+    exit_image = "assets/objectives/exit.png" if state.exit_open else "assets/objectives/exit_cover.png"
+    with profiler.phase("board"):
+        _draw_board(screen, scene, state.board, exit_image, area)
+    with profiler.phase("pawns"):
+        _draw_pawns(screen, scene.camera, state.pawns)
+    with profiler.phase("fog"):
+        fog_layer.draw(screen, scene.camera, scene.rect if area is None else area)
+    screen.blit(do_something_image, DECAL_POSITION)
+    with profiler.phase("enemy"):
+        for enemy in state.enemies:
+            if enemy.enabled:
+                _draw_enemy(screen, scene.camera, enemy)
 
-    pawns = [Pawn(6, 6, "BLUE"), Pawn(8, 8, "RED")]
-    first_player = Player(0, pawns, {Direction.NORTH, Direction.SOUTH})
-    second_player = Player(1, pawns, {Direction.WEST, Direction.EAST})
+# Draw the HUD panels, or only those overlapping one of the dirty rectangles
+def _draw_sidebar(screen, state, oxygen_gauge, player_indicators, dirty=None):
+    if dirty is None or oxygen_gauge.rect.collidelist(dirty) != -1:
+        with profiler.phase("oxygen"):
+            oxygen_gauge.draw(screen, oxygen_gauge.key(state.oxygen))
+    with profiler.phase("indicators"):
+        for indicator, player in zip(player_indicators, state.players):
+            if dirty is None or indicator.rect.collidelist(dirty) != -1:
+                indicator.draw(screen, indicator.key(player))
 
-    oxygen = 100
-    exit_open = False
-    enemy = Enemy(7, 1, False, -1)
+def _track_changes(scene, state, exit_cells, do_something_image, oxygen_gauge, player_indicators):
+    # Compare what is about to be drawn with the previous frame and mark the rectangles that differ
+    scene.track("pawns", tuple((pawn.x, pawn.y, pawn.color) for pawn in state.pawns),
+                [scene.cell_rect(pawn.x, pawn.y) for pawn in state.pawns])
+    scene.track("enemies", tuple((enemy.x, enemy.y, enemy.enabled) for enemy in state.enemies),
+                [scene.cell_rect(enemy.x, enemy.y) for enemy in state.enemies])
+    scene.track("exit", state.exit_open, [scene.cell_rect(*state.board.id_to_cartesian(id)) for id in exit_cells])
+    for x, y in state.changed_cells:
+        scene.mark_cell(x, y)
+    state.changed_cells.clear()
+    scene.track("decal", int(state.signal), [do_something_image.get_rect(topleft=DECAL_POSITION)])
+    scene.track("oxygen", oxygen_gauge.key(state.oxygen), [oxygen_gauge.rect])
+    for index, (indicator, player) in enumerate(zip(player_indicators, state.players)):
+        scene.track(("indicator", index), indicator.key(player), [indicator.rect])
 
-    while running:
-        # Draw board and other elements
-        if exit_open:
-            _draw_board(screen, board, "assets/objectives/exit.png")
-        else:
-            _draw_board(screen, board, "assets/objectives/exit_cover.png")
-        _draw_pawns(screen, pawns)
-        _draw_oxygen_panel(screen, oxygen_image_view, scale_image_view, oxygen)
-        _draw_transparencies(screen, transparency_surfaces)
-        _draw_player_indicator(screen, first_player_indicator_surface, first_player, 1050, 225)
-        _draw_player_indicator(screen, second_player_indicator_surface, second_player, 1050, 675)
+def _draw_frame(screen, scene, state, exit_cells, fog_layer, do_something_image,
+                oxygen_gauge, player_indicators):
+    # Scrolling or zooming redraws the whole viewport; otherwise only what changed is drawn
+    scene.camera.follow((pawn.x, pawn.y) for pawn in state.pawns)
+    scene.refresh()
+    with profiler.phase("fog"):
+        for rect in fog_layer.update(state.fog, scene.camera):
+            scene.mark(rect)
+    do_something_image.set_alpha(int(state.signal))
+    if PROFILE_OVERLAY:
+        # The overlay is drawn over whatever is underneath, so that area is redrawn first
+        overlay_rect = profiler.overlay().get_rect()
+        scene.mark(overlay_rect)
 
-        for pawn in pawns:
-            current_x = pawn.x // 3
-            current_y = pawn.y // 3
-            transparencies[current_x * NUM_TILES + current_y] -= 20
+    if RENDER_MODE == "dirty":
+        _track_changes(scene, state, exit_cells, do_something_image, oxygen_gauge, player_indicators)
+        for rect in scene.dirty:
+            if rect.colliderect(scene.rect):
+                # Cells at the edge of the viewport reach under the sidebar
+                screen.set_clip(rect.clip(scene.rect))
+                _draw_play_area(screen, scene, state, fog_layer, do_something_image, rect)
+        screen.set_clip(None)
+        _draw_sidebar(screen, state, oxygen_gauge, player_indicators, scene.dirty)
+    else:
+        state.changed_cells.clear()
+        screen.set_clip(scene.rect)
+        _draw_play_area(screen, scene, state, fog_layer, do_something_image)
+        screen.set_clip(None)
+        _draw_sidebar(screen, state, oxygen_gauge, player_indicators)
+        scene.mark(screen.get_rect())
+    if PROFILE_OVERLAY:
+        screen.blit(profiler.overlay(), overlay_rect)
+    with profiler.phase("present"):
+        scene.present()
 
-        do_something_transparency -= 30
-        if do_something_transparency < 0:
-            do_something_transparency = 0
-        do_something_image.set_alpha(do_something_transparency)
-        screen.blit(do_something_image, (250, 250))
-        
-        for i in range(len(transparencies)):
-            transparencies[i] += 0.6
-            if transparencies[i] > 255:
-                transparencies[i] = 255
-            if transparencies[i] < 0:
-                transparencies[i] = 0
-            transparency_surfaces[i].fill((0, 0, 0, transparencies[i]))
+def main():
+    assets.preload(IMAGES)
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+    pygame.display.set_caption("Miner Issues")
+    startup.mark("window")
+    clock = pygame.time.Clock()
 
-        # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                match event.key: 
-                    case pygame.K_UP:
-                        first_player.move(Direction.NORTH, board)
-                    case pygame.K_DOWN:
-                        first_player.move(Direction.SOUTH, board)
-                    case pygame.K_a:
-                        second_player.move(Direction.WEST, board)
-                    case pygame.K_d:
-                        second_player.move(Direction.EAST, board)
-                    case pygame.K_k:
-                        first_player.rotate_pawn()
-                    case pygame.K_f:
-                        second_player.rotate_pawn() 
-                    case pygame.K_h:
-                        do_something_transparency = 255
-            elif event.type==pygame.JOYDEVICEADDED:
-                joy = pygame.joystick.Joystick(event.device_index)
-            elif event.type == pygame.JOYBUTTONDOWN:
-                if event.button == 1:
-                    if event.joy == 0:
-                        first_player.rotate_pawn()
-                    else:
-                        second_player.rotate_pawn()
-                if event.button == 2:
-                    do_something_transparency = 255
-            elif event.type == pygame.JOYAXISMOTION:
-                if event.joy == 0:
-                    if event.axis == 1 and event.value < -0.5:
-                        first_player.move(Direction.NORTH, board)
-                    elif event.axis == 1 and event.value > 0.5:
-                        first_player.move(Direction.SOUTH, board)
-                else:
-                    if event.axis == 0 and event.value < -0.5:
-                        second_player.move(Direction.WEST, board)
-                    elif event.axis == 0 and event.value > 0.5:
-                        second_player.move(Direction.EAST, board)
+    level = sys.argv[1] if len(sys.argv) > 1 else None
+    replay = Replay.load(REPLAY_FILE) if REPLAY_FILE else None
+    if replay:
+        level = replay.level
+        try:
+            replay.check_level()
+        except (OSError, ValueError) as error:
+            raise SystemExit(f"MINER_REPLAY: {error}")
+    frames = replay.frames() if replay else None
+    player_count, pawn_count = (replay.player_count, replay.pawn_count) if replay else (PLAYER_COUNT, PAWN_COUNT)
+    board = _create_board(level)
+    try:
+        check_counts(board.width, board.height, player_count, pawn_count)
+    except ValueError as error:
+        raise SystemExit(f"MINER_PLAYERS/MINER_PAWNS: {error}")
+    client = None
+    if SERVER and not replay:
+        host, _, port = SERVER.rpartition(":")
+        client = Client(host or "127.0.0.1", int(port or DEFAULT_PORT), SESSION, PLAYER_COUNT)
+    # A thin client's players are numbered from where the server placed them
+    controls = Controls(PLAYER_COUNT, first_player=client.first_player if client else 0)
+    resume = None
+    if SNAPSHOT_FILE and not replay and not client and os.path.exists(SNAPSHOT_FILE):
+        with open(SNAPSHOT_FILE, "rb") as file:
+            resume = file.read()
+        # The game resumes on the configured board, so the restart key still
+        # goes back to the level; a snapshot of any other level is ignored
+        try:
+            saved_level = snapshot.level(resume)
+            if (saved_level.width, saved_level.height, saved_level.walls) != (board.width, board.height, board.walls):
+                raise ValueError(f"it is of another level than {level or 'the built-in one'}")
+        except ValueError as error:
+            print(f"not resuming from {SNAPSHOT_FILE}: {error}", file=sys.stderr)
+            resume = None
+    # A recording has to start from the level itself, so resumed sessions are not recorded
+    recorder = Recorder(level, player_count, pawn_count) if RECORD_DIR and not resume and not client else None
 
-        oxygen -= 0.065
-        if oxygen < 0:
-            break
-        
-        for pawn in pawns:
-            if board.cells[Board.cartesian_to_id(pawn.x, pawn.y)].objective == Objective.OXYGEN_TANK:
-                oxygen += 25
-                if oxygen > 100:
-                    oxygen = 100
-                board.cells[Board.cartesian_to_id(pawn.x, pawn.y)].objective = Objective.EMPTY
+    state = new_game(board, player_count, pawn_count)
+    initial = snapshot.save(state)
+    if resume:
+        snapshot.restore(state, resume)
+        state.changed_cells.clear()
+    elif client:
+        state = snapshot.load(client.snapshot)
+    startup.mark("level")
+    scene = Scene(state.board, _create_camera(state.board))
+    scene.mark(screen.get_rect())
+    exit_cells = state.board.cells_with(Objective.EXIT)
+    fog_layer = FogLayer(state.board.width, state.board.height)
+    oxygen_gauge = _create_oxygen_gauge()
+    player_indicators = _create_player_indicators(state.players)
+    watcher = None
+    if HOT_RELOAD and level and not replay and not client:
+        watcher = LevelWatcher(level)
+    elif HOT_RELOAD:
+        print("MINER_HOT_RELOAD needs a level file, and is off for replays and thin clients", file=sys.stderr)
 
-        if all(board.cells[Board.cartesian_to_id(pawn.x, pawn.y)].objective == Objective.PRESSURE_PLATE for pawn in pawns):
-            exit_open = True
-            enemy.interact(board, pawns)
+    # set_alpha() mutates the surface, so the decal keeps its own copy
+    do_something_image = assets.get("assets/decals/dosomething.png").copy()
+    startup.mark("assets")
 
-        if enemy.enabled:
-            _draw_enemy(screen, enemy)
-            enemy.interact(board, pawns)
-            if any(pawn.x == enemy.x and pawn.y == enemy.y for pawn in pawns):
-                pygame.display.flip()
-                break
-        
-        for pawn in pawns:
-            if board.cells[Board.cartesian_to_id(pawn.x, pawn.y)].objective == Objective.EXIT and exit_open:
-                pawns.remove(pawn)
+    cprofile = cProfile.Profile() if CPROFILE_FILE else None
+    if cprofile:
+        cprofile.enable()
 
-        if not pawns:
-            win = True
-            pygame.display.flip()
-            break 
+    timestep = FixedTimestep(TICK_RATE)
+    saved = bytearray(snapshot.size(state))
+    next_save = state.time + SNAPSHOT_INTERVAL
+    previous = None
+    pending = []
+    # When the oldest pending input was sampled, and when the inputs of the tick being drawn were
+    pending_since = shown_since = None
+    running = True
+    elapsed = 0
+    while running and state.status is Status.PLAYING:
+        profiler.begin_frame()
+        with profiler.phase("events"):
+            # Sampled at the start of the frame so the inputs reach this frame's ticks
+            events = pygame.event.get()
+            inputs, running = controls.read(events, pygame.time.get_ticks())
+            for event in events:
+                if event.type == pygame.VIDEORESIZE:
+                    # The display surface follows the window; the layout is rebuilt around it
+                    screen = pygame.display.get_surface()
+                    width, height = screen.get_size()
+                    scene.camera.resize(pygame.Rect(0, 0, width - SIDEBAR_WIDTH, height))
+                    oxygen_gauge = _create_oxygen_gauge(width, height)
+                    player_indicators = _create_player_indicators(state.players, width, height)
+                    scene.mark(screen.get_rect())
+                elif event.type == pygame.KEYDOWN and event.key in ZOOM_IN_KEYS + ZOOM_OUT_KEYS:
+                    scene.camera.zoom(1 if event.key in ZOOM_IN_KEYS else -1)
+                elif event.type == pygame.MOUSEWHEEL:
+                    scene.camera.zoom(event.y)
+            if not replay and not client and any(event.type == pygame.KEYDOWN and event.key == RESTART_KEY for event in events):
+                snapshot.restore(state, initial)
+                scene.mark(screen.get_rect())
+                inputs, pending, previous = [], [], None
+                next_save = state.time + SNAPSHOT_INTERVAL
+                if recorder:
+                    recorder = Recorder(level, player_count, pawn_count)
+            if watcher:
+                try:
+                    change = watcher.poll()
+                    if change and (change[1].width, change[1].height) != (state.board.width, state.board.height):
+                        # A new size starts the level over, so it needs room for the pawns
+                        check_counts(change[1].width, change[1].height, player_count, pawn_count)
+                except (LevelError, OSError, ValueError) as error:
+                    print(f"hot reload: {error}", file=sys.stderr)
+                    change = None
+                if change:
+                    started = time.perf_counter()
+                    old_level, new_level = change
+                    # After a rejected new size, the previous level is not the one being played
+                    same_size = (new_level.width, new_level.height) == (state.board.width, state.board.height)
+                    diff = diff_levels(old_level, new_level) if same_size else None
+                    if diff is None:
+                        state = new_game(Board.from_level(new_level), player_count, pawn_count)
+                        scene = Scene(state.board, _create_camera(state.board, *screen.get_size()))
+                        scene.mark(screen.get_rect())
+                        fog_layer = FogLayer(state.board.width, state.board.height)
+                        previous = None
+                    else:
+                        apply_diff(state, new_level, diff)
+                        scene.redraw_walls(diff.walls)
+                    exit_cells = state.board.cells_with(Objective.EXIT)
+                    initial = _level_start(state.board, new_level, player_count, pawn_count)
+                    # The recording would no longer replay against the level file
+                    recorder = None
+                    changes = "a new size" if diff is None else f"{len(diff.walls)} wall, {len(diff.objectives)} objective cells"
+                    print(f"hot reload: {level}: {changes} in {(time.perf_counter() - started) * 1e3:.1f} ms", file=sys.stderr)
+            if inputs and not pending:
+                pending_since = time.perf_counter()
+            # Inputs wait for the next tick when a frame runs none
+            pending += inputs
+        with profiler.phase("logic"):
+            if client:
+                client.send(pending)
+                pending, pending_since = [], None
+                data = client.poll()
+                if data is not None:
+                    snapshot.restore(state, data)
+                running = running and client.connected
+                ticks = []
+            else:
+                ticks = timestep.advance(elapsed)
+            for index, dt in enumerate(ticks):
+                if frames is not None:
+                    inputs, dt = next(frames, (None, None))
+                    if inputs is None:
+                        running = False
+                        break
+                elif pending:
+                    inputs, pending = pending, []
+                    shown_since, pending_since = pending_since, None
+                else:
+                    inputs = []
+                if INTERPOLATE and index == len(ticks) - 1:
+                    previous = capture(state)
+                step(state, inputs, dt)
+                if recorder:
+                    recorder.record(inputs, dt)
+                if state.status is not Status.PLAYING:
+                    break
+            if SNAPSHOT_FILE and not client and state.time >= next_save:
+                next_save = state.time + SNAPSHOT_INTERVAL
+                if len(saved) != snapshot.size(state):
+                    saved = bytearray(snapshot.size(state))
+                snapshot.save_into(state, saved)
+                with open(SNAPSHOT_FILE + ".tmp", "wb") as file:
+                    file.write(saved)
+                os.replace(SNAPSHOT_FILE + ".tmp", SNAPSHOT_FILE)
+        view = interpolate(previous, state, timestep.alpha) if previous is not None else state
+        _draw_frame(screen, scene, view, exit_cells, fog_layer, do_something_image,
+                    oxygen_gauge, player_indicators)
+        if shown_since is not None:
+            # From sampling the input to handing the frame that shows it to the display
+            profiler.measure("latency", (time.perf_counter() - shown_since) * 1e3)
+            shown_since = None
+        if STARTUP_REPORT and profiler.frame_count == 0:
+            startup.mark("first frame")
+            print(startup.report(), file=sys.stderr)
+        with profiler.phase("wait"):
+            elapsed = clock.tick(FRAME_RATE)
+        profiler.end_frame()
 
-        pygame.display.flip()
-        clock.tick(60)
+    if cprofile:
+        cprofile.disable()
+        cprofile.dump_stats(CPROFILE_FILE)
+    if TRACE_DIR:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        profiler.save_json(os.path.join(TRACE_DIR, "frames.json"))
+        profiler.save_trace(os.path.join(TRACE_DIR, "trace.json"))
+    if SNAPSHOT_FILE and not client and state.status is not Status.PLAYING and os.path.exists(SNAPSHOT_FILE):
+        os.remove(SNAPSHOT_FILE)
+    if client:
+        client.close()
+    if recorder:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        recorder.save(os.path.join(RECORD_DIR, time.strftime("%Y%m%d-%H%M%S.mrep")))
 
-    font = pygame.font.SysFont("luxiserif", 100)
-    if win and exit_open:
-        time_text = font.render('YOU ESCAPED', True, WHITE)  
+    _draw_play_area(screen, scene, state, fog_layer, do_something_image)
+    if state.status is Status.WON:
+        time_text = fonts.render("YOU ESCAPED", "luxiserif", 100, WHITE)
     else:
-        time_text = font.render('YOU MINED', True, DARK_RED)
-    screen.blit(time_text, (SCREEN_WIDTH // 2 - time_text.get_width() // 2 - 100, SCREEN_HEIGHT // 2 - time_text.get_height() // 2))
+        time_text = fonts.render("YOU MINED", "luxiserif", 100, DARK_RED)
+    screen.blit(time_text, (screen.get_width() // 2 - time_text.get_width() // 2 - 100,
+                            screen.get_height() // 2 - time_text.get_height() // 2))
     pygame.display.flip()
     pygame.time.wait(2000)
     pygame.quit()
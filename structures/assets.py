@@ -0,0 +1,64 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Union
+
+import pygame
+from pygame import Surface
+
+class Assets:
+    # Decodes every image once and shares the resulting Surfaces, including
+    # pre-scaled variants keyed by (path, scale).
+    def __init__(self):
+        self._surfaces: dict[tuple[str, Union[int, float]], Surface] = {}
+        self._pending: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, scale: Union[int, float] = 1) -> Surface:
+        surface = self._surfaces.get((path, scale))
+        if surface is not None:
+            self.hits += 1
+            return surface
+        self.misses += 1
+        return self._cache(path, scale)
+
+    def preload(self, paths: Iterable[str], workers: int = 4):
+        # Starts decoding on a thread pool and returns immediately, so the
+        # files load while the window is being created. get() waits for an
+        # image still in flight and converts it on the calling thread.
+        executor = ThreadPoolExecutor(workers, thread_name_prefix="assets")
+        for path in paths:
+            if (path, 1) not in self._surfaces and path not in self._pending:
+                self._pending[path] = executor.submit(pygame.image.load, path)
+        executor.shutdown(wait=False)
+
+    def _cache(self, path: str, scale: Union[int, float]) -> Surface:
+        if scale == 1:
+            surface = self._decode(path)
+        else:
+            base = self._surfaces.get((path, 1)) or self._cache(path, 1)
+            surface = pygame.transform.scale_by(base, scale)
+        self._surfaces[(path, scale)] = surface
+        return surface
+
+    def _decode(self, path: str) -> Surface:
+        pending = self._pending.pop(path, None)
+        image = pending.result() if pending is not None else pygame.image.load(path)
+        # Matching the display pixel format makes every later blit a plain copy
+        if pygame.display.get_surface() is None:
+            return image
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "surfaces": len(self._surfaces), "pending": len(self._pending)}
+
+    def clear(self):
+        for pending in self._pending.values():
+            pending.cancel()
+        self._pending.clear()
+        self._surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+assets = Assets()
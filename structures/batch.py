@@ -0,0 +1,249 @@
+from typing import Optional
+
+import numpy as np
+
+from structures.board import Board
+from structures.cell import Objective
+from structures.direction import Direction
+from structures.enemy import COOLDOWN, Enemy
+from structures.game import (MAX_OXYGEN, OXYGEN_DRAIN, OXYGEN_TANK_REFILL, PLAYER_MOVEMENT, Action, GameState,
+                             Status, new_game, schedule_timers, start_positions)
+from structures.paths import NO_STEP, UNREACHABLE
+
+# Value in an actions array for a player who does nothing this step
+NO_ACTION = -1
+# Pawn cell of a pawn that has left through the exit
+GONE = -1
+
+class BatchEnv:
+    # count games on one level held as NumPy arrays, each step applying the
+    # rules of game.step to all of them with a fixed number of array
+    # operations. Every player gives at most one action per step, applied in
+    # player order. The enemy follows the board's path table (as Enemy.move
+    # does without a flow field), so the board has to be small enough to have
+    # one. Spawners, fog and the signal are left out: the fog and the signal
+    # never change the outcome.
+    #
+    # Pawns keep their slot when they leave (the cell becomes GONE), while
+    # pawn_index counts only the pawns still in play, as an index into the
+    # game's pawn list would.
+    def __init__(self, board: Board, count: int, player_count: int = 2, pawn_count: int = 2):
+        if board.paths is None:
+            raise ValueError("the enemy needs the board's path table, so the board must be at most PATH_TABLE_LIMIT cells")
+        size = board.width * board.height
+        self.board = board
+        self.count = count
+        self.player_count = player_count
+        self.pawn_count = pawn_count
+        self.size = size
+
+        # The cell reached moving in each direction from each cell, or -1
+        self.neighbors = np.full((len(Direction), size), -1, np.int32)
+        for direction in Direction:
+            offset = Direction.get_coordinate_offset(direction)
+            for id in range(size):
+                x, y = board.id_to_cartesian(id)
+                if board.in_bounds(x + offset.x, y + offset.y) and board.is_open(id, direction):
+                    self.neighbors[direction.value, id] = board.cartesian_to_id(x + offset.x, y + offset.y)
+        self.distances = np.frombuffer(board.paths.distances, np.uint16).reshape(size, size)
+        self.steps = np.frombuffer(board.paths.steps, np.uint8).reshape(size, size)
+        # Which actions move each player: True at [player, action] for their two directions
+        self.movement = np.zeros((player_count, len(Action)), bool)
+        for player in range(player_count):
+            for direction in PLAYER_MOVEMENT[player % len(PLAYER_MOVEMENT)]:
+                self.movement[player, direction.value] = True
+
+        positions, (enemy_x, enemy_y) = start_positions(board.width, board.height, pawn_count)
+        self._start_pawns = np.array([board.cartesian_to_id(x, y) for x, y in positions], np.int32)
+        self._start_enemy = board.cartesian_to_id(enemy_x, enemy_y)
+        self._start_objectives = np.frombuffer(bytes(board.objectives), np.uint8).reshape(board.height, board.width)
+
+        self.objectives = np.empty((count, board.height, board.width), np.uint8)
+        self.pawns = np.empty((count, pawn_count), np.int32)
+        self.pawn_index = np.empty((count, player_count), np.int32)
+        self.enemy = np.empty(count, np.int32)
+        self.enemy_enabled = np.empty(count, bool)
+        self.enemy_last_move = np.empty(count, np.int64)
+        self.oxygen = np.empty(count, np.float64)
+        self.exit_open = np.empty(count, bool)
+        self.on_plates = np.empty(count, bool)
+        self.time = np.empty(count, np.int64)
+        self.status = np.empty(count, np.int8)
+        self._cells = self.objectives.reshape(count, size)
+        self._rows = np.arange(count)
+        self.reset()
+
+        # Read-only views of the arrays above, which are only ever changed in
+        # place, so the same views stay current from step to step
+        self.observations = {name: _read_only(array) for name, array in (
+            ("walls", np.broadcast_to(np.frombuffer(bytes(board.walls), np.uint8).reshape(board.height, board.width),
+                                      (count, board.height, board.width))),
+            ("objectives", self.objectives),
+            ("pawns", self.pawns),
+            ("pawn_index", self.pawn_index),
+            ("enemy", self.enemy),
+            ("enemy_enabled", self.enemy_enabled),
+            ("oxygen", self.oxygen),
+            ("exit_open", self.exit_open),
+            ("time", self.time),
+            ("status", self.status),
+        )}
+
+    def reset(self, games: Optional[np.ndarray] = None):
+        # Starts the given games (a boolean mask or indices; default all) over
+        games = slice(None) if games is None else games
+        self.objectives[games] = self._start_objectives
+        self.pawns[games] = self._start_pawns
+        self.pawn_index[games] = np.arange(self.player_count) % self.pawn_count
+        self.enemy[games] = self._start_enemy
+        self.enemy_enabled[games] = False
+        self.enemy_last_move[games] = -1
+        self.oxygen[games] = MAX_OXYGEN
+        self.exit_open[games] = False
+        self.on_plates[games] = False
+        self.time[games] = 0
+        self.status[games] = Status.PLAYING.value
+
+    @property
+    def done(self) -> np.ndarray:
+        return self.status != Status.PLAYING.value
+
+    def _selected(self, present: np.ndarray, player: int) -> np.ndarray:
+        # Slot of the pawn each game's player holds: the pawn_index-th pawn still in play
+        return np.argmax(np.cumsum(present, axis=1) > self.pawn_index[:, player, None], axis=1)
+
+    def _on_plates(self, present: np.ndarray) -> np.ndarray:
+        on_plate = self._cells[self._rows[:, None], np.maximum(self.pawns, 0)] == Objective.PRESSURE_PLATE.value
+        return np.all(on_plate | ~present, axis=1)
+
+    def step(self, actions: np.ndarray, dt: int):
+        # actions holds an Action value or NO_ACTION per game and player, shape (count, player_count)
+        rows, cells, pawns = self._rows, self._cells, self.pawns
+        playing = self.status == Status.PLAYING.value
+        if not playing.any():
+            return
+        self.time[playing] += dt
+        now = self.time
+
+        present = pawns != GONE
+        remaining = present.sum(axis=1)
+        moved = np.zeros(self.count, bool)
+        for player in range(self.player_count):
+            action = actions[:, player]
+            rotate = playing & (action == Action.ROTATE.value)
+            self.pawn_index[rotate, player] = (self.pawn_index[rotate, player] + 1) % remaining[rotate]
+            direction = np.clip(action, 0, len(Direction) - 1)
+            slot = self._selected(present, player)
+            target = self.neighbors[direction, pawns[rows, slot]]
+            move = (playing & (action >= 0) & self.movement[player, np.clip(action, 0, len(Action) - 1)]
+                    & (target != -1) & ~np.any(pawns == target[:, None], axis=1))
+            pawns[rows[move], slot[move]] = target[move]
+            moved |= move
+
+        self.oxygen[playing] -= OXYGEN_DRAIN * (dt / 1000)
+        lost = playing & (self.oxygen < 0)
+        self.status[lost] = Status.LOST.value
+        playing &= ~lost
+
+        # Objectives only need checking when a pawn has stepped onto a new cell
+        moved &= playing
+        if moved.any():
+            for slot in range(self.pawn_count):
+                position = pawns[:, slot]
+                tank = moved & (position != GONE) & (cells[rows, np.maximum(position, 0)] == Objective.OXYGEN_TANK.value)
+                self.oxygen[tank] = np.minimum(self.oxygen[tank] + OXYGEN_TANK_REFILL, MAX_OXYGEN)
+                cells[rows[tank], position[tank]] = Objective.EMPTY.value
+            self.on_plates[moved] = self._on_plates(present)[moved]
+
+        plates = playing & self.on_plates
+        self.exit_open |= plates
+        woken = plates & ~self.enemy_enabled
+        self.enemy_enabled |= woken
+        self.enemy_last_move[woken] = now[woken]
+
+        enemy = self.enemy
+        chase = playing & self.enemy_enabled & (now - self.enemy_last_move >= COOLDOWN)
+        if chase.any():
+            self.enemy_last_move[chase] = now[chase]
+            # The nearest pawn still in play, the first one on a tie
+            distances = np.where(present, self.distances[enemy[:, None], np.maximum(pawns, 0)], UNREACHABLE + 1)
+            target = pawns[rows, np.argmin(distances, axis=1)]
+            step = self.steps[enemy, np.maximum(target, 0)]
+            chase &= step != NO_STEP
+            enemy[chase] = self.neighbors[step[chase], enemy[chase]]
+        caught = playing & self.enemy_enabled & np.any(pawns == enemy[:, None], axis=1)
+        self.status[caught] = Status.LOST.value
+        playing &= ~caught
+
+        leaving = (playing & self.exit_open & moved)[:, None] & present
+        leaving &= cells[rows[:, None], np.maximum(pawns, 0)] == Objective.EXIT.value
+        left = leaving.any(axis=1)
+        if left.any():
+            pawns[leaving] = GONE
+            present &= ~leaving
+            remaining = present.sum(axis=1)
+            self.status[left & (remaining == 0)] = Status.WON.value
+            left &= remaining > 0
+            self.on_plates[left] = self._on_plates(present)[left]
+            self.pawn_index[left] %= remaining[left, None]
+
+    def state(self, game: int) -> GameState:
+        # One game as a GameState on a board of its own, for drawing or checking against game.step
+        board = self.board.copy()
+        board.objectives[:] = self.objectives[game].tobytes()
+        board.reindex()
+        state = new_game(board, self.player_count, self.pawn_count)
+        state.flow = None
+        board.clear_occupancy()
+        state.pawns[:] = [pawn for slot, pawn in enumerate(state.pawns) if self.pawns[game, slot] != GONE]
+        for pawn, id in zip(state.pawns, self.pawns[game][self.pawns[game] != GONE]):
+            pawn.x, pawn.y = board.id_to_cartesian(int(id))
+            board.occupy(int(id))
+        for player, pawn_index in zip(state.players, self.pawn_index[game]):
+            player.pawn_index = int(pawn_index)
+        x, y = board.id_to_cartesian(int(self.enemy[game]))
+        state.enemies[:] = [Enemy(x, y, bool(self.enemy_enabled[game]), int(self.enemy_last_move[game]))]
+        state.spawners.clear()
+        state.oxygen = float(self.oxygen[game])
+        state.exit_open = bool(self.exit_open[game])
+        state.on_plates = bool(self.on_plates[game])
+        state.time = int(self.time[game])
+        state.status = Status(int(self.status[game]))
+        schedule_timers(state)
+        return state
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+def check(board: Optional[Board] = None, games: int = 64, steps: int = 2000, seed: int = 0) -> int:
+    # Plays random actions through both BatchEnv and game.step (without a flow
+    # field) and returns how many games ever disagreed
+    from structures.board import BOARD_HEIGHT, BOARD_WIDTH
+    from structures.game import step
+
+    rng = np.random.default_rng(seed)
+    board = board or Board(BOARD_HEIGHT, BOARD_WIDTH, None)
+    env = BatchEnv(board, games)
+    states = [env.state(game) for game in range(games)]
+    mismatched = set()
+    for _ in range(steps):
+        actions = rng.integers(NO_ACTION, len(Action), (games, env.player_count)).astype(np.int8)
+        env.step(actions, 16)
+        for game, state in enumerate(states):
+            inputs = [(player, Action(action)) for player, action in enumerate(actions[game]) if action != NO_ACTION]
+            step(state, inputs, 16)
+            expected = (state.status, state.time, round(state.oxygen, 6), [(pawn.x, pawn.y) for pawn in state.pawns],
+                        [player.pawn_index for player in state.players], (state.enemies[0].x, state.enemies[0].y),
+                        state.exit_open, bytes(state.board.objectives))
+            batch = env.state(game)
+            actual = (batch.status, batch.time, round(batch.oxygen, 6), [(pawn.x, pawn.y) for pawn in batch.pawns],
+                      [player.pawn_index for player in batch.players], (batch.enemies[0].x, batch.enemies[0].y),
+                      batch.exit_open, bytes(batch.board.objectives))
+            if expected != actual:
+                mismatched.add(game)
+    return len(mismatched)
+
+if __name__ == "__main__":
+    print(f"{check()} games disagreed with game.step")
@@ -0,0 +1,100 @@
+from typing import Iterable, Iterator
+
+from pygame import Rect, Surface
+
+from structures.assets import assets
+
+# Cell sizes in pixels the camera zooms between; sprites are drawn for BASE_CELL_SIZE
+ZOOM_LEVELS = (15, 20, 30, 45, 60, 90, 120)
+BASE_CELL_SIZE = 60
+# The camera scrolls once the followed pawns leave the middle half of the viewport
+FOLLOW_MARGIN = 0.25
+
+class Camera:
+    # Maps board cells to screen pixels inside a viewport. scroll is the world
+    # pixel at the viewport's top-left corner; a board smaller than the
+    # viewport is centred instead. Sprites come from the asset cache scaled
+    # for the current zoom, so every zoom level keeps its own pre-scaled set.
+    def __init__(self, viewport: Rect, board_width: int, board_height: int, cell_size: int = BASE_CELL_SIZE):
+        self.viewport = Rect(viewport)
+        self.board_width = board_width
+        self.board_height = board_height
+        self.cell_size = cell_size
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self._clamp()
+
+    @property
+    def scale(self) -> float:
+        return self.cell_size / BASE_CELL_SIZE
+
+    @property
+    def view(self) -> tuple:
+        # Changes whenever anything already drawn has to move
+        return tuple(self.viewport), self.cell_size, self.scroll_x, self.scroll_y
+
+    def sprite(self, path: str) -> Surface:
+        return assets.get(path, self.scale)
+
+    def _origin(self) -> tuple[int, int]:
+        # Screen position of the top-left corner of cell (0, 0)
+        return self.viewport.x - self.scroll_x, self.viewport.y - self.scroll_y
+
+    def _clamp(self):
+        size = self.cell_size
+        width, height = self.board_width * size, self.board_height * size
+        if width <= self.viewport.width:
+            self.scroll_x = (width - self.viewport.width) // 2
+        else:
+            self.scroll_x = min(max(self.scroll_x, 0), width - self.viewport.width)
+        if height <= self.viewport.height:
+            self.scroll_y = (height - self.viewport.height) // 2
+        else:
+            self.scroll_y = min(max(self.scroll_y, 0), height - self.viewport.height)
+
+    def cell_rect(self, x: int, y: int) -> Rect:
+        left, top = self._origin()
+        return Rect(left + x * self.cell_size, top + y * self.cell_size, self.cell_size, self.cell_size)
+
+    def cell_range(self, area: Rect) -> Rect:
+        # Board cells overlapping area (in screen pixels), as a rectangle in cell units
+        left, top = self._origin()
+        size = self.cell_size
+        x0, x1 = max((area.left - left) // size, 0), min((area.right - 1 - left) // size + 1, self.board_width)
+        y0, y1 = max((area.top - top) // size, 0), min((area.bottom - 1 - top) // size + 1, self.board_height)
+        return Rect(x0, y0, max(x1 - x0, 0), max(y1 - y0, 0))
+
+    def cells_in(self, area: Rect) -> Iterator[tuple[int, int]]:
+        cells = self.cell_range(area)
+        for y in range(cells.top, cells.bottom):
+            for x in range(cells.left, cells.right):
+                yield x, y
+
+    def follow(self, cells: Iterable[tuple[int, int]]):
+        # Scrolls by whole cells to bring the middle of cells back into the
+        # middle of the viewport, but only once it has drifted out of it
+        cells = list(cells)
+        if not cells:
+            return
+        size = self.cell_size
+        center_x = (min(x for x, _ in cells) + max(x for x, _ in cells) + 1) * size // 2
+        center_y = (min(y for _, y in cells) + max(y for _, y in cells) + 1) * size // 2
+        margin_x, margin_y = int(self.viewport.width * FOLLOW_MARGIN), int(self.viewport.height * FOLLOW_MARGIN)
+        if not margin_x <= center_x - self.scroll_x <= self.viewport.width - margin_x:
+            self.scroll_x = (center_x - self.viewport.width // 2) // size * size
+        if not margin_y <= center_y - self.scroll_y <= self.viewport.height - margin_y:
+            self.scroll_y = (center_y - self.viewport.height // 2) // size * size
+        self._clamp()
+
+    def zoom(self, steps: int):
+        # Moves steps levels through ZOOM_LEVELS, keeping the middle of the viewport in place
+        levels = sorted(set(ZOOM_LEVELS) | {self.cell_size})
+        index = min(max(levels.index(self.cell_size) + steps, 0), len(levels) - 1)
+        old, self.cell_size = self.cell_size, levels[index]
+        self.scroll_x = (self.scroll_x + self.viewport.width // 2) * self.cell_size // old - self.viewport.width // 2
+        self.scroll_y = (self.scroll_y + self.viewport.height // 2) * self.cell_size // old - self.viewport.height // 2
+        self._clamp()
+
+    def resize(self, viewport: Rect):
+        self.viewport = Rect(viewport)
+        self._clamp()
@@ -1,9 +1,4 @@
 from enum import Enum
-from dataclasses import dataclass
-from typing import ClassVar, Optional, Union
-
-import pygame
-from pygame import Surface
 
 from structures.direction import Direction
 
@@ -14,43 +9,50 @@ class Objective(Enum):
     OXYGEN_TANK = 3
     ENEMY_SPAWNER = 4
 
-@dataclass
+# Objective members indexed by value, avoiding the Enum lookup in hot paths
+OBJECTIVES = tuple(Objective)
+
+# A cell's walls are one nibble, most significant bit first: north, east, south, west
+def wall_bit(direction: Direction) -> int:
+    return 8 >> direction.value
+
+# Tile image for every wall nibble; decoding is left to whoever draws them
+WALL_IMAGES = tuple(f"assets/tiles/final{walls}.png" for walls in range(16))
+
 class Cell:
-    def _load_wall_images() -> dict[int, Surface]:
-        images = {}
-        MAX_WALL_PERMUTATIONS = 16
-        for i in range(MAX_WALL_PERMUTATIONS):
-            images[i] = pygame.image.load(f"assets/tiles/final{i}.png")
-        return images
-    images: ClassVar[dict[int, Surface]] = _load_wall_images()
-
-    id: int 
-    adjacency_matrix: list[int]
-    objective: int
-
-    def __init__(self, id: int, adjacency_matrix: Union[int, list[int]], objective: Optional[int] = Objective.EMPTY.value):
+    # Lightweight view of one cell in a Board's wall and objective layers
+    __slots__ = ("board", "id")
+
+    def __init__(self, board, id: int):
+        self.board = board
         self.id = id
-        if isinstance(adjacency_matrix, int):
-            self.adjacency_matrix = self.int_to_adjacency_matrix(adjacency_matrix)
-        elif isinstance(adjacency_matrix, list):
-            self.adjacency_matrix = adjacency_matrix
-        self.objective = objective
+
+    @property
+    def walls(self) -> int:
+        return self.board.walls[self.id]
+
+    @property
+    def adjacency_matrix(self) -> list[int]:
+        return self.int_to_adjacency_matrix(self.board.walls[self.id])
+
+    @property
+    def objective(self) -> Objective:
+        return OBJECTIVES[self.board.objectives[self.id]]
+
+    @objective.setter
+    def objective(self, objective: Objective):
+        self.board.set_objective(self.id, objective)
 
     @staticmethod
     def int_to_adjacency_matrix(num: int) -> list[int]:
-        matrix = [int(bit) for bit in bin(num)[2:]] 
-        matrix = [0] * (4 - len(matrix)) + matrix
-        return matrix
+        return [(num >> 3) & 1, (num >> 2) & 1, (num >> 1) & 1, num & 1]
 
     @staticmethod
-    def get_wall_image(adjacency_matrix: list[int]) -> Surface:
-        index = 0
-        for bit in adjacency_matrix:
-            index = (index << 1) | bit
-        return Cell.images[index]
+    def get_wall_image(walls: int) -> str:
+        return WALL_IMAGES[walls]
 
     def validate_direction(self, direction: Direction) -> bool:
-        return self.adjacency_matrix[direction.value] == 0
+        return not self.board.walls[self.id] & wall_bit(direction)
 
     def validate_objective(self, objective: Objective) -> bool:
-        return self.objective == objective.value
+        return self.board.objectives[self.id] == objective.value
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+
+import pygame
+
+from structures.game import Action, Input
+
+# Stick positions closer to the centre than this count as released
+DEADZONE = 0.5
+# A stick held in one direction repeats its action after REPEAT_DELAY ms, then every REPEAT_INTERVAL ms
+REPEAT_DELAY = 300
+REPEAT_INTERVAL = 150
+
+# Keys by the game's player index; a client whose players start further on
+# takes the bindings of the same index modulo the number of players bound
+KEY_BINDINGS: dict[int, Input] = {
+    pygame.K_UP: (0, Action.NORTH),
+    pygame.K_DOWN: (0, Action.SOUTH),
+    pygame.K_k: (0, Action.ROTATE),
+    pygame.K_h: (0, Action.SIGNAL),
+    pygame.K_a: (1, Action.WEST),
+    pygame.K_d: (1, Action.EAST),
+    pygame.K_f: (1, Action.ROTATE),
+}
+BUTTON_BINDINGS: dict[int, Action] = {
+    1: Action.ROTATE,
+    2: Action.SIGNAL,
+}
+# The stick axis each player (by the game's player index) steers with, and the
+# actions at its negative and positive ends; players past the end of this list
+# reuse it from the start, as game.PLAYER_MOVEMENT does
+AXIS_BINDINGS: list[tuple[int, Action, Action]] = [
+    (1, Action.NORTH, Action.SOUTH),
+    (0, Action.WEST, Action.EAST),
+]
+
+@dataclass
+class Stick:
+    value: float = 0
+    direction: int = 0
+    repeat_at: int = 0
+
+class Controls:
+    # Turns one frame's pygame events into game inputs. Key and button presses
+    # map straight through the binding tables. Axis motion only updates the
+    # stick's latest value, and each stick yields at most one action per frame:
+    # when it leaves the deadzone, then again at the auto-repeat rate while held.
+    # Joystick n belongs to player n, and any extra joysticks to the last player.
+    # Inputs carry local player indices, from 0; first_player is the game's
+    # index of local player 0 (Client.first_player for a thin client), and
+    # picks the bindings that steer the way the game lets that player move.
+    def __init__(self, player_count: int = 2, key_bindings: dict[int, Input] = KEY_BINDINGS,
+                 button_bindings: dict[int, Action] = BUTTON_BINDINGS,
+                 axis_bindings: list[tuple[int, Action, Action]] = AXIS_BINDINGS, first_player: int = 0):
+        self.player_count = player_count
+        self.first_player = first_player
+        self.key_bindings = self._local_keys(key_bindings)
+        self.button_bindings = button_bindings
+        self.axis_bindings = axis_bindings
+        self.joysticks: list[pygame.joystick.JoystickType] = []
+        self.sticks: dict[int, Stick] = {}
+
+    def read(self, events: list[pygame.event.Event], now: int) -> tuple[list[Input], bool]:
+        # now is in ms and only drives auto-repeat; returns False as the second value once the window is closed
+        inputs = []
+        running = True
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                binding = self.key_bindings.get(event.key)
+                if binding is not None:
+                    inputs.append(binding)
+            elif event.type == pygame.JOYDEVICEADDED:
+                self.joysticks.append(pygame.joystick.Joystick(event.device_index))
+            elif event.type == pygame.JOYBUTTONDOWN:
+                action = self.button_bindings.get(event.button)
+                if action is not None:
+                    inputs.append((self.joystick_player(event.joy), action))
+            elif event.type == pygame.JOYAXISMOTION:
+                player_index = self.joystick_player(event.joy)
+                if event.axis == self.axis_binding(player_index)[0]:
+                    self.sticks.setdefault(player_index, Stick()).value = event.value
+
+        for player_index, stick in self.sticks.items():
+            direction = (stick.value > DEADZONE) - (stick.value < -DEADZONE)
+            if direction != stick.direction:
+                stick.direction = direction
+                stick.repeat_at = now + REPEAT_DELAY
+            elif not direction or now < stick.repeat_at:
+                continue
+            else:
+                stick.repeat_at = max(stick.repeat_at + REPEAT_INTERVAL, now)
+            if direction:
+                _, negative, positive = self.axis_binding(player_index)
+                inputs.append((player_index, negative if direction < 0 else positive))
+        return inputs, running
+
+    def _local_keys(self, key_bindings: dict[int, Input]) -> dict[int, Input]:
+        # Each bound player's keys go to the first local player they fit
+        if not key_bindings:
+            return {}
+        bound = max(player_index for player_index, _ in key_bindings.values()) + 1
+        owners = {}
+        for local in range(self.player_count):
+            owners.setdefault((self.first_player + local) % bound, local)
+        return {key: (owners[player_index], action) for key, (player_index, action) in key_bindings.items()
+                if player_index in owners}
+
+    def joystick_player(self, joy: int) -> int:
+        return min(joy, self.player_count - 1)
+
+    def axis_binding(self, player_index: int) -> tuple[int, Action, Action]:
+        # player_index is local
+        return self.axis_bindings[(self.first_player + player_index) % len(self.axis_bindings)]
@@ -1,10 +1,9 @@
-from collections import deque
 from dataclasses import dataclass
-
-import pygame
+from typing import Optional
 
 from structures.board import Board
-from structures.direction import Direction, Coordinate
+from structures.direction import Direction
+from structures.paths import FlowField, bfs_step
 from structures.pawn import Pawn
 
 COOLDOWN = 1500 
@@ -16,36 +15,27 @@ class Enemy:
     enabled: bool
     last_move_tick: int
 
-    def interact(self, board: Board, pawns: list[Pawn]):
-        if self.enabled:
-            if pygame.time.get_ticks() - self.last_move_tick >= COOLDOWN:
-                self.last_move_tick = pygame.time.get_ticks()
-                self.move(board, pawns)
+    @property
+    def next_move(self) -> int:
+        # Game time in ms the enemy may move again; the game schedules its move for then
+        return self.last_move_tick + COOLDOWN
+
+    def wake(self, now: int):
+        self.enabled = True
+        self.last_move_tick = now
+
+    def move(self, board: Board, pawns: list[Pawn], flow: Optional[FlowField] = None):
+        # Step towards the nearest pawn. A flow field shared by every enemy is
+        # the cheapest; otherwise the board's path table, or a search of our own.
+        source = board.cartesian_to_id(self.x, self.y)
+        if flow is not None:
+            direction = flow.step(source)
+        elif board.paths is None:
+            direction = bfs_step(board, source, {board.cartesian_to_id(pawn.x, pawn.y) for pawn in pawns})
         else:
-            self.enabled = True
-            self.last_move_tick = pygame.time.get_ticks()
-
-    def move(self, board: Board, pawns: list[Pawn]):
-        # Move the enemy towards the nearest pawn with breadth-first search
-        goals = [Coordinate(pawn.x, pawn.y) for pawn in pawns]
-        queue = []
-        visited = {Coordinate(self.x, self.y): Coordinate(self.x, self.y)}
-        queue.append(Coordinate(self.x, self.y))
-        
-        while queue:
-            current = queue.pop(0)
-            if current in goals:
-                break
-
-            current_cell = board.cells[Board.cartesian_to_id(current.x, current.y)]
-            for direction in Direction:
-                offset = Direction.get_coordinate_offset(direction)
-                if current_cell.adjacency_matrix[direction.value] == 0:
-                    neighbor = Coordinate(current.x + offset.x, current.y + offset.y)
-                    if neighbor not in visited:
-                        visited[neighbor] = current
-                        queue.append(neighbor)
-
-        while visited[current] != Coordinate(self.x, self.y):
-            current = visited[current]
-        self.x, self.y = current.x, current.y 
+            targets = [board.cartesian_to_id(pawn.x, pawn.y) for pawn in pawns]
+            target = min(targets, key=lambda target: board.paths.distance(source, target), default=None)
+            direction = None if target is None else board.paths.step(source, target)
+        if direction is not None:
+            offset = Direction.get_coordinate_offset(direction)
+            self.x, self.y = self.x + offset.x, self.y + offset.y
@@ -0,0 +1,59 @@
+import numpy as np
+import pygame
+from pygame import Rect, Surface
+
+from structures.camera import Camera
+
+class FogLayer:
+    # The fog as an alpha mask of one pixel per cell. update() compares the
+    # game's per-cell fog with what was last uploaded, within the visible
+    # cells only, and the visible part of the mask is scaled up to the zoom
+    # once per change, so the cost follows the viewport rather than the board.
+    def __init__(self, width: int, height: int):
+        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 255))
+        self.uploaded = np.full((height, width), 255, np.uint8)
+        self._scaled = None
+        self._scaled_view = None
+
+    def update(self, fog: np.ndarray, camera: Camera) -> list[Rect]:
+        # Returns one screen rectangle per horizontal run of changed visible cells
+        cells = camera.cell_range(camera.viewport)
+        if not cells.width or not cells.height:
+            return []
+        window = (slice(cells.top, cells.bottom), slice(cells.left, cells.right))
+        alpha = fog[window].astype(np.uint8)
+        changed = alpha != self.uploaded[window]
+        rows = np.flatnonzero(changed.any(axis=1))
+        if not rows.size:
+            return []
+
+        pixels = pygame.surfarray.pixels_alpha(self.surface)
+        pixels[cells.left:cells.right, cells.top:cells.bottom] = alpha.T
+        del pixels
+        self.uploaded[window] = alpha
+        self._scaled_view = None
+
+        size = camera.cell_size
+        rects = []
+        for y in rows:
+            columns = np.flatnonzero(changed[y])
+            # Split the changed columns into contiguous runs
+            breaks = np.flatnonzero(np.diff(columns) != 1) + 1
+            for run in np.split(columns, breaks):
+                rect = camera.cell_rect(cells.left + run[0], cells.top + y)
+                rect.width = len(run) * size
+                rects.append(rect)
+        return rects
+
+    def draw(self, screen: Surface, camera: Camera, area: Rect):
+        cells = camera.cell_range(camera.viewport)
+        if not cells.width or not cells.height:
+            return
+        if self._scaled_view != camera.view:
+            size = camera.cell_size
+            self._scaled = pygame.transform.scale(self.surface.subsurface(cells), (cells.width * size, cells.height * size))
+            self._scaled_view = camera.view
+        origin = camera.cell_rect(cells.left, cells.top).topleft
+        area = area.clip(self._scaled.get_rect(topleft=origin))
+        screen.blit(self._scaled, area, area.move(-origin[0], -origin[1]))
@@ -0,0 +1,263 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import partial
+from typing import Optional
+
+import numpy as np
+
+from structures.board import Board
+from structures.cell import Objective
+from structures.direction import Direction
+from structures.enemy import Enemy
+from structures.paths import FlowField
+from structures.pawn import Pawn
+from structures.player import Player
+from structures.scheduler import Scheduler
+
+# Rates are per second of game time; the originals were tuned per frame at 60 FPS
+MAX_OXYGEN = 100
+OXYGEN_DRAIN = 0.065 * 60
+OXYGEN_TANK_REFILL = 25
+# Pawns clear the fog within FOG_RADIUS cells of their own
+FOG_RADIUS = 1
+FOG_CLEAR = 20 * 60
+FOG_RECOVERY = 0.6 * 60
+SIGNAL_FADE = 30 * 60
+MAX_ALPHA = 255
+
+# Players alternate between the two axes, and pawns between the two miner sprites
+PLAYER_MOVEMENT = ({Direction.NORTH, Direction.SOUTH}, {Direction.WEST, Direction.EAST})
+PAWN_COLORS = ("BLUE", "RED")
+# Snapshots store the player and pawn counts in a byte each
+MAX_PLAYERS = 255
+MAX_PAWNS = 255
+# Every spawner releases an enemy this often (in ms of game time) until MAX_ENEMIES are out
+SPAWN_INTERVAL = 8000
+MAX_ENEMIES = 256
+
+class Action(Enum):
+    NORTH = 0
+    EAST = 1
+    SOUTH = 2
+    WEST = 3
+    ROTATE = 4
+    SIGNAL = 5
+
+    def direction(self) -> Direction:
+        return Direction(self.value)
+
+class Status(Enum):
+    PLAYING = 0
+    WON = 1
+    LOST = 2
+
+# (player index, action) pairs collected during one step
+Input = tuple[int, Action]
+
+@dataclass
+class GameState:
+    board: Board
+    pawns: list[Pawn]
+    players: list[Player]
+    # The first enemy is the guard woken by the pressure plates; the rest come from spawners
+    enemies: list[Enemy]
+    oxygen: float = MAX_OXYGEN
+    exit_open: bool = False
+    # Fog alpha per cell, indexed [y, x]
+    fog: np.ndarray = field(default_factory=lambda: np.zeros((0, 0), np.float32))
+    signal: float = 0
+    time: int = 0
+    status: Status = Status.PLAYING
+    # Whether every pawn stands on a pressure plate, refreshed whenever a pawn moves
+    on_plates: bool = False
+    # Cell ids of the board's enemy spawners
+    spawners: list[int] = field(default_factory=list)
+    next_spawn: int = SPAWN_INTERVAL
+    # Shared by all enemies, rebuilt whenever the pawns' cells change
+    flow: Optional[FlowField] = field(default=None, repr=False)
+    # Cells whose objective changed since the renderer last drained this set
+    changed_cells: set[tuple[int, int]] = field(default_factory=set)
+    # Tank cells pawns stepped onto during the current step, filled by a board trigger
+    entered_tanks: list[int] = field(default_factory=list)
+    # Enemy moves and spawner waves on the game clock; schedule_timers() derives
+    # it from the fields above, so it is never saved
+    scheduler: Scheduler = field(default_factory=Scheduler, repr=False)
+    # Indices of the enemies whose move came due during the current step, filled by the scheduler
+    due_enemies: list[int] = field(default_factory=list)
+
+def check_counts(width: int, height: int, player_count: int, pawn_count: int):
+    # Raises ValueError for counts a game on a width x height board cannot start with
+    if not 1 <= player_count <= MAX_PLAYERS:
+        raise ValueError(f"{player_count} players; there must be between 1 and {MAX_PLAYERS}")
+    if not 1 <= pawn_count <= MAX_PAWNS:
+        raise ValueError(f"{pawn_count} pawns; there must be between 1 and {MAX_PAWNS}")
+    # Every cell but the enemy's can take a pawn
+    if pawn_count > width * height - 1:
+        raise ValueError(f"{pawn_count} pawns; a {width}x{height} board has room for {width * height - 1}")
+
+def start_positions(width: int, height: int, pawn_count: int = 2) -> tuple[list[tuple[int, int]], tuple[int, int]]:
+    # The first two pawns go either side of the centre and the enemy near the
+    # top, as on the built-in level; further pawns fill in nearest the centre,
+    # from a square around it that grows past the board's edges as needed
+    center_x, center_y = width // 2, height // 2
+    enemy = (center_x, 1)
+    pawns = [(center_x - 1, center_y - 1), (center_x + 1, center_y + 1)][:pawn_count]
+    if pawn_count > len(pawns):
+        radius = 1
+        while (2 * radius + 1) ** 2 < pawn_count + 3:
+            radius += 1
+        taken = set(pawns) | {enemy}
+        while True:
+            nearby = [(x, y) for y in range(max(center_y - radius, 0), min(center_y + radius + 1, height))
+                      for x in range(max(center_x - radius, 0), min(center_x + radius + 1, width)) if (x, y) not in taken]
+            if len(nearby) >= pawn_count - len(pawns) or radius >= max(width, height):
+                break
+            radius += 1
+        nearby.sort(key=lambda cell: (abs(cell[0] - center_x) + abs(cell[1] - center_y), cell[1], cell[0]))
+        pawns += nearby[:pawn_count - len(pawns)]
+    return pawns, enemy
+
+def new_game(board: Board, player_count: int = 2, pawn_count: int = 2) -> GameState:
+    # Every player can select any pawn; player i starts on pawn i
+    check_counts(board.width, board.height, player_count, pawn_count)
+    positions, (enemy_x, enemy_y) = start_positions(board.width, board.height, pawn_count)
+    pawns = [Pawn(x, y, PAWN_COLORS[index % len(PAWN_COLORS)]) for index, (x, y) in enumerate(positions)]
+    board.clear_occupancy()
+    for pawn in pawns:
+        board.occupy(board.cartesian_to_id(pawn.x, pawn.y))
+    players = [Player(index % len(pawns), pawns, set(PLAYER_MOVEMENT[index % len(PLAYER_MOVEMENT)]))
+               for index in range(player_count)]
+    fog = np.full((board.height, board.width), MAX_ALPHA, np.float32)
+    state = GameState(board, pawns, players, [Enemy(enemy_x, enemy_y, False, -1)], fog=fog,
+                      spawners=board.cells_with(Objective.ENEMY_SPAWNER), flow=FlowField(board))
+    board.clear_triggers()
+    board.on_enter(Objective.OXYGEN_TANK, state.entered_tanks.append)
+    schedule_timers(state)
+    return state
+
+def schedule_timers(state: GameState):
+    # Registers every timed event the state implies, replacing any already
+    # registered; needed whenever its enemies, spawners or clock are replaced wholesale
+    state.scheduler.clear()
+    state.due_enemies.clear()
+    for index, enemy in enumerate(state.enemies):
+        if enemy.enabled:
+            _schedule_move(state, index)
+    if state.spawners:
+        state.scheduler.every(SPAWN_INTERVAL, partial(_spawn_wave, state), state.next_spawn)
+
+def _schedule_move(state: GameState, index: int):
+    state.scheduler.at(state.enemies[index].next_move, partial(state.due_enemies.append, index))
+
+def _move_enemy(state: GameState, index: int, flow: Optional[FlowField]):
+    enemy = state.enemies[index]
+    enemy.last_move_tick = state.time
+    enemy.move(state.board, state.pawns, flow)
+    _schedule_move(state, index)
+
+def _spawn_wave(state: GameState):
+    board = state.board
+    state.next_spawn += SPAWN_INTERVAL
+    for id in state.spawners:
+        if len(state.enemies) >= MAX_ENEMIES:
+            return
+        x, y = board.id_to_cartesian(id)
+        state.enemies.append(Enemy(x, y, True, state.time))
+        _schedule_move(state, len(state.enemies) - 1)
+
+def step(state: GameState, inputs: list[Input], dt: int):
+    # Advance the game by dt milliseconds of game time after applying inputs
+    if state.status is not Status.PLAYING:
+        return
+    state.time += dt
+    seconds = dt / 1000
+    board = state.board
+
+    moved = False
+    for player_index, action in inputs:
+        if player_index >= len(state.players):
+            continue
+        player = state.players[player_index]
+        match action:
+            case Action.ROTATE:
+                player.rotate_pawn()
+            case Action.SIGNAL:
+                state.signal = MAX_ALPHA
+            case _:
+                moved |= player.move(action.direction(), board)
+
+    fog = state.fog
+    for pawn in state.pawns:
+        fog[max(pawn.y - FOG_RADIUS, 0):pawn.y + FOG_RADIUS + 1,
+            max(pawn.x - FOG_RADIUS, 0):pawn.x + FOG_RADIUS + 1] -= FOG_CLEAR * seconds
+    fog += FOG_RECOVERY * seconds
+    np.clip(fog, 0, MAX_ALPHA, out=fog)
+    state.signal = max(state.signal - SIGNAL_FADE * seconds, 0)
+
+    state.oxygen -= OXYGEN_DRAIN * seconds
+    if state.oxygen < 0:
+        state.status = Status.LOST
+        return
+
+    # The board counts pawns per objective and reports tanks as they are
+    # stepped on, so objectives cost nothing unless a pawn moved
+    if moved:
+        for id in state.entered_tanks:
+            # Skipped when the pawn stepped off again within the same step
+            if board.objectives[id] == Objective.OXYGEN_TANK.value and board.is_occupied(id):
+                state.oxygen = min(state.oxygen + OXYGEN_TANK_REFILL, MAX_OXYGEN)
+                board.set_objective(id, Objective.EMPTY)
+                state.changed_cells.add(board.id_to_cartesian(id))
+        state.entered_tanks.clear()
+        state.on_plates = board.pawns_on(Objective.PRESSURE_PLATE) == len(state.pawns)
+
+    # Spawner waves go out and due enemy moves are collected; nothing that is not due is looked at
+    enemies = state.enemies
+    count = len(enemies)
+    state.scheduler.run(state.time)
+    due = sorted(state.due_enemies)
+    state.due_enemies.clear()
+    spawned = list(range(count, len(enemies)))
+
+    # Enemies that could now share a cell with a pawn
+    checking = due + spawned
+    if state.on_plates and not state.exit_open:
+        # The exit opens and the guard wakes up, once
+        state.exit_open = True
+        if enemies and not enemies[0].enabled:
+            enemies[0].wake(state.time)
+            _schedule_move(state, 0)
+            checking = [0] + checking
+    if moved:
+        # A pawn may have walked into any enemy, moving or not
+        checking = [index for index, enemy in enumerate(enemies) if enemy.enabled]
+
+    flow = state.flow
+    if flow is not None and due:
+        # One search per change of pawn cells, however many enemies read it
+        flow.update((board.cartesian_to_id(pawn.x, pawn.y) for pawn in state.pawns), state.time)
+    moving = set(due)
+    for index in checking:
+        if index in moving:
+            _move_enemy(state, index, flow)
+        enemy = enemies[index]
+        if board.is_occupied(board.cartesian_to_id(enemy.x, enemy.y)):
+            state.status = Status.LOST
+            return
+
+    if state.exit_open and moved and board.pawns_on(Objective.EXIT):
+        # Players share the pawn list, so it is filtered in place
+        remaining = []
+        for pawn in state.pawns:
+            id = board.cartesian_to_id(pawn.x, pawn.y)
+            if board.objectives[id] == Objective.EXIT.value:
+                board.vacate(id)
+            else:
+                remaining.append(pawn)
+        state.pawns[:] = remaining
+        if not state.pawns:
+            state.status = Status.WON
+            return
+        state.on_plates = board.pawns_on(Objective.PRESSURE_PLATE) == len(state.pawns)
+        for player in state.players:
+            player.pawn_index %= len(state.pawns)
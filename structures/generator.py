@@ -0,0 +1,63 @@
+import random
+from typing import Optional
+
+from structures.cell import Objective
+from structures.game import start_positions
+from structures.level import Level
+
+# Chance (out of 256) that an extra passage is knocked through, turning the
+# perfect maze into a cave with loops
+DEFAULT_OPENNESS = 24
+
+def _lanes(data: bytes) -> int:
+    # Packs one byte per cell into an int so a whole layer can be shifted and
+    # added with a single operation; no lane ever exceeds 15, so nothing carries
+    return int.from_bytes(data, "little")
+
+def _chance(rng: random.Random, size: int, threshold: int) -> bytes:
+    return rng.randbytes(size).translate(bytes(int(i < threshold) for i in range(256)))
+
+def generate_level(width: int, height: int, seed: Optional[int] = None, oxygen_tanks: Optional[int] = None,
+                   pressure_plates: int = 2, enemy_spawners: int = 0, openness: int = DEFAULT_OPENNESS) -> Level:
+    # Binary-tree maze: every cell opens either north or east, so the layout is
+    # decided by one random byte per cell and built without a per-cell loop
+    rng = random.Random(seed)
+    size = width * height
+
+    north = bytearray(_chance(rng, size, 128))
+    east = bytearray(north.translate(bytes([1, 0]) + bytes(254)))
+    # The top row can only run east and the right column only north
+    north[width - 1::width] = b"\x01" * height
+    east[width - 1::width] = bytes(height)
+    north[:width] = bytes(width)
+    east[:width] = b"\x01" * (width - 1) + b"\x00"
+
+    # Extra openings make loops; they are kept off the edges of the board
+    extra_north = bytearray(_chance(rng, size, openness))
+    extra_north[:width] = bytes(width)
+    extra_east = bytearray(_chance(rng, size, openness))
+    extra_east[width - 1::width] = bytes(height)
+    either = bytes([0, 1, 1, 1]) + bytes(252)
+    north = (_lanes(north) * 2 + _lanes(extra_north)).to_bytes(size, "little").translate(either)
+    east = (_lanes(east) * 2 + _lanes(extra_east)).to_bytes(size, "little").translate(either)
+
+    # A cell is open to the south when the cell below opened north, and to the
+    # west when the cell to its left opened east
+    north_lanes, east_lanes = _lanes(north), _lanes(east)
+    mask = (1 << (8 * size)) - 1
+    walls = (_lanes(b"\x0f" * size) - 8 * north_lanes - 4 * east_lanes
+             - 2 * (north_lanes >> (8 * width)) - ((east_lanes << 8) & mask))
+
+    objectives = bytearray(size)
+    pawns, enemy = start_positions(width, height)
+    reserved = {y * width + x for x, y in pawns + [enemy]}
+    if oxygen_tanks is None:
+        oxygen_tanks = max(1, size // 25)
+    placements = [Objective.EXIT] + [Objective.PRESSURE_PLATE] * pressure_plates
+    placements += [Objective.ENEMY_SPAWNER] * enemy_spawners + [Objective.OXYGEN_TANK] * oxygen_tanks
+    cells = rng.sample(range(size), min(size, len(placements) + len(reserved)))
+    cells = [id for id in cells if id not in reserved]
+    for id, objective in zip(cells, placements):
+        objectives[id] = objective.value
+
+    return Level(width, height, walls.to_bytes(size, "little"), bytes(objectives))
@@ -0,0 +1,78 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from structures.cell import OBJECTIVES, Objective
+from structures.game import GameState, schedule_timers
+from structures.level import Level, load_level
+
+@dataclass
+class LevelDiff:
+    # Ids of the cells whose walls or objective differ between two levels of one size
+    walls: list[int]
+    objectives: list[int]
+
+    def __bool__(self) -> bool:
+        return bool(self.walls or self.objectives)
+
+def _changed(old: bytes, new: bytes) -> list[int]:
+    if old == new:
+        return []
+    return np.flatnonzero(np.frombuffer(old, np.uint8) != np.frombuffer(new, np.uint8)).tolist()
+
+def diff_levels(old: Level, new: Level) -> Optional[LevelDiff]:
+    # None when the size changed, which no per-cell diff can express
+    if (old.width, old.height) != (new.width, new.height):
+        return None
+    return LevelDiff(_changed(old.walls, new.walls), _changed(old.objectives, new.objectives))
+
+def apply_diff(state: GameState, level: Level, diff: LevelDiff):
+    # Brings the changed cells of a running game to level, touching only the
+    # caches they affect: paths when walls changed, and the objective index,
+    # pawn counts, plates and spawners when objectives did. Changed objectives
+    # are reported through changed_cells; redrawing changed walls is up to the
+    # caller (Scene.redraw_walls).
+    board = state.board
+    if diff.walls:
+        for id in diff.walls:
+            board.walls[id] = level.walls[id]
+        board.rebuild_paths()
+        if state.flow is not None:
+            state.flow.invalidate()
+    if diff.objectives:
+        for id in diff.objectives:
+            board.set_objective(id, OBJECTIVES[level.objectives[id]])
+            state.changed_cells.add(board.id_to_cartesian(id))
+        state.on_plates = board.pawns_on(Objective.PRESSURE_PLATE) == len(state.pawns)
+        spawners = board.cells_with(Objective.ENEMY_SPAWNER)
+        if spawners != state.spawners:
+            state.spawners[:] = spawners
+            schedule_timers(state)
+
+class LevelWatcher:
+    # Notices edits to a level file by polling its modification time and
+    # size, which is cheap enough to do every frame. Edits are diffed against
+    # the previous version of the file rather than the live board, so what
+    # the game changed itself (tanks picked up) stays as it is.
+    def __init__(self, path: str):
+        self.path = path
+        self._key = self._stat()
+        self.level = load_level(path)
+
+    def _stat(self) -> tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self) -> Optional[tuple[Level, Level]]:
+        # (previous, new) once the file changed. A file that fails to load
+        # raises LevelError or OSError; it is tried again when it next changes,
+        # so an editor caught halfway through a save is only reported.
+        key = self._stat()
+        if key == self._key:
+            return None
+        self._key = key
+        level = load_level(self.path)
+        previous, self.level = self.level, level
+        return previous, level
@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+from typing import Hashable
+
+import pygame
+from pygame import Rect, Surface
+
+from structures.assets import assets
+from structures.direction import Direction
+from structures.player import Player
+
+Color = tuple[int, int, int]
+
+# Height a PlayerIndicator's layout needs; shorter panels (more players) scale it down
+INDICATOR_HEIGHT = 300
+
+class Fonts:
+    # SysFont scans the system font list on every call, so fonts are opened
+    # once and rendered strings are kept by (text, font, size, color)
+    def __init__(self):
+        self._fonts: dict[tuple[str, int], pygame.font.Font] = {}
+        self._texts: dict[tuple[str, str, int, Color], Surface] = {}
+
+    def get(self, name: str, size: int) -> pygame.font.Font:
+        font = self._fonts.get((name, size))
+        if font is None:
+            font = self._fonts[(name, size)] = pygame.font.SysFont(name, size)
+        return font
+
+    def render(self, text: str, name: str, size: int, color: Color) -> Surface:
+        surface = self._texts.get((text, name, size, color))
+        if surface is None:
+            surface = self._texts[(text, name, size, color)] = self.get(name, size).render(text, True, color)
+        return surface
+
+    def clear(self):
+        self._fonts.clear()
+        self._texts.clear()
+
+fonts = Fonts()
+
+class Panel(ABC):
+    # A piece of the HUD composited into its own surface. draw() rebuilds the
+    # surface only when the key describing its contents changes; otherwise it
+    # costs one blit.
+    def __init__(self, rect: Rect, background: Color = (0, 0, 0)):
+        self.rect = Rect(rect)
+        self.background = background
+        self.surface = pygame.Surface(self.rect.size)
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.builds = 0
+        self._key: Hashable = None
+
+    @abstractmethod
+    def build(self, key: Hashable):
+        # Draws the contents described by key onto the freshly cleared surface
+        ...
+
+    def draw(self, screen: Surface, key: Hashable):
+        if self.builds == 0 or key != self._key:
+            self.surface.fill(self.background)
+            self.build(key)
+            self._key = key
+            self.builds += 1
+        screen.blit(self.surface, self.rect)
+
+class OxygenGauge(Panel):
+    # scale is the full 0-100% bar in screen coordinates; it may reach past
+    # the panel, in which case the ends are cut off
+    def __init__(self, rect: Rect, scale: Rect, background: Color, bar: Color):
+        super().__init__(rect, background)
+        self.scale = Rect(scale)
+        self.bar = bar
+
+    def key(self, oxygen: float) -> int:
+        # Only whole pixels of bar height make a visible difference
+        return int(oxygen * self.scale.height // 100)
+
+    def build(self, height: int):
+        top = self.scale.bottom - height - self.rect.top
+        pygame.draw.rect(self.surface, self.bar, (self.scale.left - self.rect.left + 40, top, 20, height), 0, 3)
+
+class PlayerIndicator(Panel):
+    # Shows which pawn a player controls and the directions they can move in
+    def __init__(self, rect: Rect, label: Surface, label_position: tuple[int, int],
+                 pawn_images: list[str], direction_images: dict[frozenset[Direction], str]):
+        super().__init__(rect)
+        self.label = label
+        self.label_position = label_position
+        self.pawn_images = pawn_images
+        self.direction_images = direction_images
+        self.scale = min(1, self.rect.height / INDICATOR_HEIGHT)
+
+    def key(self, player: Player) -> tuple[int, frozenset[Direction]]:
+        return player.pawn_index, frozenset(player.possible_movement)
+
+    def build(self, key: tuple[int, frozenset[Direction]]):
+        pawn_index, possible_movement = key
+        scale = self.scale
+        self.surface.blit(assets.get(self.pawn_images[pawn_index % len(self.pawn_images)], 2 * scale), (15, round(185 * scale)))
+        direction_image = self.direction_images.get(possible_movement)
+        if direction_image is not None:
+            self.surface.blit(assets.get(direction_image, 0.7 * scale), (5, round(225 * scale)))
+        self.surface.blit(self.label, self.label_position)
@@ -0,0 +1,218 @@
+import hashlib
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from structures.cell import Objective
+
+# Binary layout: header, walls packed two cells per byte (high nibble first),
+# then one Objective value per cell. Everything is row by row.
+MAGIC = b"MINE"
+VERSION = 1
+HEADER = struct.Struct("<4sBHH")
+
+# Text layout: a "miner-level <version> <width> <height>" line, one row of hex
+# wall digits per board row, then one row of objective symbols per board row.
+# Blank lines and lines starting with "#" are ignored.
+TEXT_MAGIC = "miner-level"
+SYMBOLS = {
+    Objective.EMPTY: ".",
+    Objective.EXIT: "X",
+    Objective.PRESSURE_PLATE: "P",
+    Objective.OXYGEN_TANK: "O",
+    Objective.ENEMY_SPAWNER: "S",
+}
+
+# Smallest width and height with room for the starting pawns and enemy (see game.start_positions)
+MIN_SIZE = 3
+
+# Files larger than this are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 1 << 20
+# Parsed levels kept; hot reload adds one for every saved edit
+LEVEL_CACHE_SIZE = 8
+# Bytes in a level file's content hash
+DIGEST_SIZE = 16
+
+INVALID = 0xFF
+
+def _table(mapping: dict[int, int]) -> bytes:
+    return bytes(mapping.get(i, INVALID) for i in range(256))
+
+_HEX_DIGITS = _table({ord(c): int(c, 16) for c in "0123456789abcdefABCDEF"})
+_HEX_CHARS = _table({i: ord(c) for i, c in enumerate("0123456789ABCDEF")})
+_SYMBOL_VALUES = _table({ord(symbol): objective.value for objective, symbol in SYMBOLS.items()})
+_VALUE_SYMBOLS = _table({objective.value: ord(symbol) for objective, symbol in SYMBOLS.items()})
+_HIGH_NIBBLE = bytes(i >> 4 for i in range(256))
+_LOW_NIBBLE = bytes(i & 15 for i in range(256))
+_SHIFT_HIGH = bytes((i << 4) & 0xFF for i in range(256))
+_NORTH_BIT = bytes((i >> 3) & 1 for i in range(256))
+_EAST_BIT = bytes((i >> 2) & 1 for i in range(256))
+_SOUTH_BIT = bytes((i >> 1) & 1 for i in range(256))
+_WEST_BIT = bytes(i & 1 for i in range(256))
+
+class LevelError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class Level:
+    width: int
+    height: int
+    walls: bytes
+    objectives: bytes
+
+    @classmethod
+    def from_board(cls, board) -> "Level":
+        return cls(board.width, board.height, bytes(board.walls), bytes(board.objectives))
+
+# Parsed levels keyed by content hash, least recently used first, each with
+# whether it was validated; and the latest content hash of each file, by path
+_levels: OrderedDict[bytes, tuple[Level, bool]] = OrderedDict()
+_digests: dict[str, tuple[int, int, bytes]] = {}
+
+def load_level(path: str, validate: bool = True) -> Level:
+    stat = os.stat(path)
+    path_key = os.path.abspath(path)
+    known = _digests.get(path_key)
+    if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        level = _cached(known[2], path, validate)
+        if level is not None:
+            return level
+
+    with open(path, "rb") as file:
+        if stat.st_size > MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest, level = _parse_cached(memoryview(mapped), path, validate)
+        else:
+            digest, level = _parse_cached(memoryview(file.read()), path, validate)
+    _digests[path_key] = (stat.st_mtime_ns, stat.st_size, digest)
+    return level
+
+def level_digest(path: str) -> bytes:
+    # Content hash of a level file, the one load_level caches it by
+    load_level(path)
+    return _digests[os.path.abspath(path)][2]
+
+def clear_level_cache():
+    _levels.clear()
+    _digests.clear()
+
+def _cached(digest: bytes, name: str, validate: bool) -> Optional[Level]:
+    # A level cached without validation is validated the first time it is asked for with it
+    entry = _levels.get(digest)
+    if entry is None:
+        return None
+    _levels.move_to_end(digest)
+    level, validated = entry
+    if validate and not validated:
+        validate_level(level, name)
+        _levels[digest] = (level, True)
+    return level
+
+def _parse_cached(data: memoryview, path: str, validate: bool) -> tuple[bytes, Level]:
+    try:
+        digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+        level = _cached(digest, path, validate)
+        if level is None:
+            level = parse_level(data, path)
+            if validate:
+                validate_level(level, path)
+            _levels[digest] = (level, validate)
+            if len(_levels) > LEVEL_CACHE_SIZE:
+                _levels.popitem(last=False)
+        return digest, level
+    finally:
+        # The view may point into an mmap, which cannot be closed while it is exported
+        data.release()
+
+def parse_level(data: memoryview, name: str = "<level>") -> Level:
+    if data[:len(MAGIC)] == MAGIC:
+        return _parse_binary(data, name)
+    return _parse_text(bytes(data), name)
+
+def _parse_binary(data: memoryview, name: str) -> Level:
+    if len(data) < HEADER.size:
+        raise LevelError(f"{name}: truncated header")
+    _, version, width, height = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise LevelError(f"{name}: unsupported version {version}")
+    _check_size(width, height, name)
+    size = width * height
+    packed_size = (size + 1) // 2
+    if len(data) != HEADER.size + packed_size + size:
+        raise LevelError(f"{name}: expected {HEADER.size + packed_size + size} bytes, found {len(data)}")
+
+    packed = bytes(data[HEADER.size:HEADER.size + packed_size])
+    walls = bytearray(packed_size * 2)
+    walls[0::2] = packed.translate(_HIGH_NIBBLE)
+    walls[1::2] = packed.translate(_LOW_NIBBLE)
+    del walls[size:]
+    objectives = bytes(data[HEADER.size + packed_size:])
+    if max(objectives, default=0) >= len(Objective):
+        raise LevelError(f"{name}: unknown objective value {max(objectives)}")
+    return Level(width, height, bytes(walls), objectives)
+
+def _check_size(width: int, height: int, name: str):
+    if width < MIN_SIZE or height < MIN_SIZE:
+        raise LevelError(f"{name}: {width}x{height} is smaller than {MIN_SIZE}x{MIN_SIZE}")
+
+def _parse_text(data: bytes, name: str) -> Level:
+    lines = [line.strip() for line in data.splitlines()]
+    lines = [line for line in lines if line and not line.startswith(b"#")]
+    if not lines:
+        raise LevelError(f"{name}: empty level")
+    header = lines[0].split()
+    if len(header) != 4 or header[0] != TEXT_MAGIC.encode():
+        raise LevelError(f"{name}: expected '{TEXT_MAGIC} <version> <width> <height>' header")
+    try:
+        version, width, height = (int(value) for value in header[1:])
+    except ValueError:
+        raise LevelError(f"{name}: expected whole numbers in '{TEXT_MAGIC} <version> <width> <height>' header")
+    if version != VERSION:
+        raise LevelError(f"{name}: unsupported version {version}")
+    _check_size(width, height, name)
+    rows = lines[1:]
+    if len(rows) != 2 * height or any(len(row) != width for row in rows):
+        raise LevelError(f"{name}: expected {2 * height} rows of {width} cells")
+
+    walls = b"".join(rows[:height]).translate(_HEX_DIGITS)
+    objectives = b"".join(rows[height:]).translate(_SYMBOL_VALUES)
+    if INVALID in walls:
+        raise LevelError(f"{name}: invalid wall digit in cell {walls.index(INVALID)}")
+    if INVALID in objectives:
+        raise LevelError(f"{name}: invalid objective symbol in cell {objectives.index(INVALID)}")
+    return Level(width, height, walls, objectives)
+
+def validate_level(level: Level, name: str = "<level>"):
+    # Every wall has to be present on both sides, which is checked a whole
+    # row (east/west) or the whole board (north/south) at a time
+    width, walls = level.width, level.walls
+    east, west = walls.translate(_EAST_BIT), walls.translate(_WEST_BIT)
+    for start in range(0, len(walls), width):
+        if east[start:start + width - 1] != west[start + 1:start + width]:
+            x = next(x for x in range(width - 1) if east[start + x] != west[start + x + 1])
+            raise LevelError(f"{name}: east/west walls disagree at ({x}, {start // width})")
+    south, north = walls.translate(_SOUTH_BIT), walls.translate(_NORTH_BIT)
+    if south[:-width] != north[width:]:
+        id = next(id for id in range(len(walls) - width) if south[id] != north[id + width])
+        raise LevelError(f"{name}: north/south walls disagree at ({id % width}, {id // width})")
+
+def save_level(level: Level, path: str, binary: bool = True):
+    if binary:
+        walls = level.walls + bytes(len(level.walls) % 2)
+        high = int.from_bytes(walls[0::2].translate(_SHIFT_HIGH), "big")
+        packed = (high | int.from_bytes(walls[1::2], "big")).to_bytes(len(walls) // 2, "big")
+        data = HEADER.pack(MAGIC, VERSION, level.width, level.height) + packed + level.objectives
+        with open(path, "wb") as file:
+            file.write(data)
+        return
+
+    walls = level.walls.translate(_HEX_CHARS).decode()
+    objectives = level.objectives.translate(_VALUE_SYMBOLS).decode()
+    rows = [walls[start:start + level.width] for start in range(0, len(walls), level.width)]
+    rows += [objectives[start:start + level.width] for start in range(0, len(objectives), level.width)]
+    with open(path, "w") as file:
+        file.write(f"{TEXT_MAGIC} {VERSION} {level.width} {level.height}\n")
+        file.write("\n".join(rows) + "\n")
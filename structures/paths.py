@@ -0,0 +1,180 @@
+from array import array
+from collections import deque
+from typing import Iterable, Optional
+
+import numpy as np
+
+from structures.cell import wall_bit
+from structures.direction import Direction
+
+UNREACHABLE = 0xFFFF
+NO_STEP = 0xFF
+# Flow field distances are 32-bit: a winding path on a large level can be longer
+# than 16 bits hold, while a level's 16-bit width and height keep every path
+# shorter than this
+FLOW_UNREACHABLE = 0xFFFFFFFF
+
+# Largest board area (in cells) that gets an all-pairs table. It takes one
+# search per cell to build and 3 bytes per pair of cells: about 45 ms and
+# 0.2 MB at 15x15, 120 ms and 0.5 MB at 20x20, but a second and 3 MB at 32x32
+PATH_TABLE_LIMIT = 20 * 20
+# A flow field build is one search of the whole board: about 1 ms at 15x15,
+# 5 ms at 64x64, 30 ms at 256x256 and 300 ms at 1000x1000. The game rebuilds
+# it on a step with enemies due after the pawns moved, so on boards larger
+# than FLOW_REBUILD_LIMIT cells it is rebuilt at most every
+# FLOW_REBUILD_INTERVAL ms of game time, and enemies head for where the pawns
+# were up to that long ago.
+FLOW_REBUILD_LIMIT = 64 * 64
+FLOW_REBUILD_INTERVAL = 1000
+
+class PathTable:
+    # All-pairs shortest paths over the maze. For every (source, target) pair
+    # it stores the distance and the direction of the first step, indexed by
+    # source * size + target, so a lookup costs two array reads.
+    def __init__(self, board):
+        self.width = board.width
+        self.height = board.height
+        self.size = board.width * board.height
+        self.distances = array('H', [UNREACHABLE]) * (self.size * self.size)
+        self.steps = bytearray([NO_STEP]) * (self.size * self.size)
+        predecessors = self._predecessors(board)
+        for target in range(self.size):
+            self._build_target(predecessors, target)
+
+    def _predecessors(self, board) -> list[list[tuple[int, int]]]:
+        # Walls are not always mirrored between neighbours, so a cell counts as
+        # a predecessor only when its own wall towards the next cell is open
+        predecessors = [[] for _ in range(self.size)]
+        for source in range(self.size):
+            y, x = divmod(source, self.width)
+            for direction in Direction:
+                offset = Direction.get_coordinate_offset(direction)
+                new_x, new_y = x + offset.x, y + offset.y
+                if board.is_open(source, direction) and 0 <= new_x < self.width and 0 <= new_y < self.height:
+                    predecessors[new_y * self.width + new_x].append((source, direction.value))
+        return predecessors
+
+    def _build_target(self, predecessors: list[list[tuple[int, int]]], target: int):
+        # Breadth-first search backwards from target
+        size, distances, steps = self.size, self.distances, self.steps
+        distances[target * size + target] = 0
+        queue = deque([target])
+        while queue:
+            current = queue.popleft()
+            distance = distances[current * size + target] + 1
+            for source, direction in predecessors[current]:
+                index = source * size + target
+                if distances[index] == UNREACHABLE:
+                    distances[index] = distance
+                    steps[index] = direction
+                    queue.append(source)
+
+    def distance(self, source: int, target: int) -> int:
+        return self.distances[source * self.size + target]
+
+    def step(self, source: int, target: int) -> Optional[Direction]:
+        direction = self.steps[source * self.size + target]
+        return None if direction == NO_STEP else Direction(direction)
+
+class FlowField:
+    # Distance from every cell to the nearest target, and the direction of the
+    # first step towards it, from one breadth-first search seeded with all the
+    # targets. Any number of enemies then read their next move with one lookup.
+    def __init__(self, board):
+        self.board = board
+        self.targets: Optional[list[int]] = None
+        self.distances = array('I')
+        self.steps = bytearray()
+        self.builds = 0
+        self.built_at = 0
+        self.interval = FLOW_REBUILD_INTERVAL if board.width * board.height > FLOW_REBUILD_LIMIT else 0
+
+    def update(self, targets: Iterable[int], now: Optional[int] = None) -> bool:
+        # Rebuilds only when the set of targets changed, and given the game
+        # time now in ms, not within interval of the last build unless the
+        # field was invalidated; returns whether it did
+        targets = sorted(set(targets))
+        if targets == self.targets:
+            return False
+        if self.targets is not None and now is not None and now < self.built_at + self.interval:
+            return False
+        self.targets = targets
+        self.built_at = now or 0
+        self._build(targets)
+        self.builds += 1
+        return True
+
+    def invalidate(self):
+        # For when the walls change under the same targets
+        self.targets = None
+
+    def _build(self, targets: list[int]):
+        # Searches backwards, a whole layer of cells at a time: a cell is
+        # reached from a neighbour it can step into. Each layer is kept in the
+        # order a queue would hold it (by the cell it was reached from, then
+        # N, E, S, W), so a cell with two such neighbours picks the same one a
+        # cell-by-cell search does. Wall bits are N=8, E=4, S=2, W=1.
+        width, height = self.board.width, self.board.height
+        size = width * height
+        self.distances = array('I', [FLOW_UNREACHABLE]) * size
+        self.steps = bytearray([NO_STEP]) * size
+        distances = np.frombuffer(self.distances, np.uintc)
+        steps = np.frombuffer(self.steps, np.uint8)
+        walls = np.frombuffer(self.board.walls, np.uint8).reshape(height, width)
+        # Per direction of the step: where the stepping cell lies, and whether
+        # it is there with that wall open, for every cell
+        offsets = np.array([width, -1, -width, 1])
+        reached_from = np.zeros((height, width, 4), bool)
+        reached_from[:-1, :, 0] = walls[1:, :] & 8 == 0
+        reached_from[:, 1:, 1] = walls[:, :-1] & 4 == 0
+        reached_from[1:, :, 2] = walls[:-1, :] & 2 == 0
+        reached_from[:, :-1, 3] = walls[:, 1:] & 1 == 0
+        reached_from = reached_from.reshape(size, 4)
+        directions = np.array([direction.value for direction in Direction], np.uint8)
+        # Where in its layer each cell first turned up
+        order = np.empty(size, np.intp)
+        frontier = np.array(targets, np.intp)
+        distances[frontier] = 0
+        distance = 0
+        while frontier.size:
+            distance += 1
+            sources = frontier[:, None] + offsets
+            found = reached_from[frontier]
+            found &= distances.take(sources, mode='clip') == FLOW_UNREACHABLE
+            sources = sources[found]
+            # Keeps the first time each cell turns up, in queue order
+            turns = np.arange(sources.size)
+            order[sources] = sources.size
+            np.minimum.at(order, sources, turns)
+            first = order[sources] == turns
+            frontier = sources[first]
+            distances[frontier] = distance
+            steps[frontier] = np.broadcast_to(directions, found.shape)[found][first]
+
+    def distance(self, source: int) -> int:
+        return self.distances[source]
+
+    def step(self, source: int) -> Optional[Direction]:
+        direction = self.steps[source]
+        return None if direction == NO_STEP else Direction(direction)
+
+def bfs_step(board, source: int, targets: set[int]) -> Optional[Direction]:
+    # First step from source towards the nearest target, for boards too large for a PathTable
+    width, height = board.width, board.height
+    offsets = [(direction, wall_bit(direction), Direction.get_coordinate_offset(direction)) for direction in Direction]
+    first_steps = {source: None}
+    queue = deque([source])
+    while queue:
+        current = queue.popleft()
+        if current in targets:
+            return first_steps[current]
+        y, x = divmod(current, width)
+        walls = board.walls[current]
+        for direction, bit, offset in offsets:
+            new_x, new_y = x + offset.x, y + offset.y
+            if not walls & bit and 0 <= new_x < width and 0 <= new_y < height:
+                neighbor = new_y * width + new_x
+                if neighbor not in first_steps:
+                    first_steps[neighbor] = first_steps[current] or direction
+                    queue.append(neighbor)
+    return None
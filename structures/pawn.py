@@ -1,7 +1,6 @@
 from dataclasses import dataclass
-from typing import NamedTuple, Self
 
-from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
+from structures.board import Board
 from structures.direction import Direction
 
 @dataclass
@@ -10,14 +9,19 @@ class Pawn:
     y: int
     color: tuple[int, int, int]
 
-    def move(self, offset: NamedTuple, direction: Direction, board: Board, pawns: list[Self]):
+    def move(self, direction: Direction, board: Board) -> bool:
+        # Other pawns are found through the board's occupancy, which this keeps up to date
+        offset = Direction.get_coordinate_offset(direction)
         new_x = self.x + offset.x
         new_y = self.y + offset.y
-
-        current_cell = board.cells[Board.cartesian_to_id(self.x, self.y)]
-        if (0 <= new_x < BOARD_WIDTH and 0 <= new_y < BOARD_HEIGHT and 
-            all(not (new_x == pawn.x and new_y == pawn.y) for pawn in pawns) and
-            current_cell.validate_direction(direction)):
-            self.x = new_x
-            self.y = new_y
-    
+        if not board.in_bounds(new_x, new_y):
+            return False
+        source = board.cartesian_to_id(self.x, self.y)
+        target = board.cartesian_to_id(new_x, new_y)
+        if board.is_occupied(target) or not board.is_open(source, direction):
+            return False
+        board.vacate(source)
+        board.occupy(target)
+        self.x = new_x
+        self.y = new_y
+        return True
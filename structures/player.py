@@ -15,11 +15,8 @@ class Player:
         self.pawns = pawns
         self.possible_movement = possible_movement
 
-    def move(self, direction: Direction, board: Board):
-        if direction in self.possible_movement:
-            pawns = self.pawns.copy()
-            pawns.pop(self.pawn_index)
-            self.pawns[self.pawn_index].move(Direction.get_coordinate_offset(direction), direction, board, pawns)
+    def move(self, direction: Direction, board: Board) -> bool:
+        return direction in self.possible_movement and self.pawns[self.pawn_index].move(direction, board)
    
     def rotate_pawn(self):
         self.pawn_index = (self.pawn_index + 1) % len(self.pawns)
\ No newline at end of file
@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional
+
+# pygame is imported by overlay() alone, so the headless server runs without it
+if TYPE_CHECKING:
+    import pygame
+
+# Frames kept for the rolling percentiles, and phase spans kept for the trace
+WINDOW = 600
+TRACE_LIMIT = 100_000
+PERCENTILES = (50, 95, 99)
+# The overlay text is re-rendered this often (in frames) rather than every frame
+OVERLAY_REFRESH = 30
+
+class FrameProfiler:
+    # Times named phases of every frame. A phase may run several times in one
+    # frame (once per dirty rectangle, say); its durations are summed into the
+    # frame's total for that phase when end_frame() is called.
+    def __init__(self, window: int = WINDOW):
+        self.frames: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.spans: deque[tuple[str, int, int, int]] = deque(maxlen=TRACE_LIMIT)
+        self.frame_count = 0
+        self._window = window
+        self._current: dict[str, int] = defaultdict(int)
+        self._frame_start: Optional[int] = None
+        self._overlay: Optional["pygame.Surface"] = None
+        self._overlay_frame = 0
+        self._font: Optional["pygame.font.Font"] = None
+
+    def begin_frame(self):
+        self._frame_start = time.perf_counter_ns()
+
+    def end_frame(self):
+        if self._frame_start is None:
+            return
+        end = time.perf_counter_ns()
+        self._current["frame"] = end - self._frame_start
+        self.spans.append(("frame", self.frame_count, self._frame_start, end - self._frame_start))
+        for name, elapsed in self._current.items():
+            self.frames[name].append(elapsed / 1e6)
+        self._current.clear()
+        self._frame_start = None
+        self.frame_count += 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            self._current[name] += elapsed
+            self.spans.append((name, self.frame_count, start, elapsed))
+
+    def measure(self, name: str, value: float):
+        # Records a value in ms that is not a phase of the frame, such as input latency
+        self.frames[name].append(value)
+
+    def percentiles(self, name: str) -> dict[str, float]:
+        # Nearest-rank percentiles, in milliseconds, over the rolling window
+        samples = sorted(self.frames[name])
+        if not samples:
+            return {}
+        stats = {f"p{p}": samples[min(len(samples) - 1, len(samples) * p // 100)] for p in PERCENTILES}
+        stats["max"] = samples[-1]
+        stats["mean"] = sum(samples) / len(samples)
+        return stats
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {name: self.percentiles(name) for name in self.frames}
+
+    def save_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump({
+                "frames": self.frame_count,
+                "window": self._window,
+                "summary": self.summary(),
+                "samples": {name: list(samples) for name, samples in self.frames.items()},
+            }, file, indent=2)
+
+    def save_trace(self, path: str):
+        # Chrome trace event format, viewable in chrome://tracing or Perfetto
+        origin = self.spans[0][2] if self.spans else 0
+        events = [{
+            "name": name,
+            "ph": "X",
+            "ts": (start - origin) / 1e3,
+            "dur": elapsed / 1e3,
+            "pid": 1,
+            "tid": 1,
+            "args": {"frame": frame},
+        } for name, frame, start, elapsed in self.spans]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def overlay(self) -> "pygame.Surface":
+        # Small text panel with p50/p95/max per phase, refreshed every OVERLAY_REFRESH frames
+        import pygame
+        if self._overlay is not None and self.frame_count - self._overlay_frame < OVERLAY_REFRESH:
+            return self._overlay
+        self._overlay_frame = self.frame_count
+        if self._font is None:
+            self._font = pygame.font.SysFont("couriernew,monospace", 14)
+        lines = [f"{'phase':10} {'p50':>6} {'p95':>6} {'max':>6}"]
+        for name, stats in sorted(self.summary().items()):
+            if stats:
+                lines.append(f"{name:10} {stats['p50']:6.2f} {stats['p95']:6.2f} {stats['max']:6.2f}")
+        line_height = self._font.get_linesize()
+        self._overlay = pygame.Surface((220, line_height * len(lines) + 8))
+        self._overlay.set_alpha(200)
+        for row, line in enumerate(lines):
+            self._overlay.blit(self._font.render(line, True, (255, 255, 0)), (4, 4 + row * line_height))
+        return self._overlay
+
+    def reset(self):
+        self.frames.clear()
+        self.spans.clear()
+        self._current.clear()
+        self._frame_start = None
+        self._overlay = None
+        self.frame_count = 0
+
+profiler = FrameProfiler()
+
+def process_start() -> float:
+    # When the process started, on the perf_counter clock. Linux records it in
+    # clock ticks since boot; elsewhere the first call stands in for it.
+    try:
+        with open("/proc/self/stat") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.perf_counter() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter()
+
+class StartupTimer:
+    # Named milestones from process start, for the cold-start report
+    def __init__(self):
+        self.start = process_start()
+        self.marks: list[tuple[str, float]] = []
+
+    def mark(self, name: str):
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self) -> str:
+        lines = [f"{'startup':16} {'total':>9} {'step':>9}"]
+        previous = self.start
+        for name, at in self.marks:
+            lines.append(f"{name:16} {(at - self.start) * 1e3:7.1f}ms {(at - previous) * 1e3:7.1f}ms")
+            previous = at
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+import asyncio
+import socket
+import struct
+import zlib
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+
+from structures.game import Action, Input
+
+# Every message is a header (type, payload length) followed by the payload.
+# State travels as snapshots (see structures.snapshot): the first one whole,
+# then each as the XOR with the one before, which is mostly zero bytes, and
+# both zlib-compressed. TCP keeps them in order, so no acknowledgements are
+# needed; a snapshot whose size changed (a pawn left, an enemy spawned) goes
+# out whole again.
+HEADER = struct.Struct("<BI")
+JOIN = struct.Struct("<B")
+WELCOME = struct.Struct("<BI")
+INPUT = struct.Struct("<BB")
+UPDATE = struct.Struct("<IB")
+MAX_PAYLOAD = 1 << 24
+DEFAULT_PORT = 7777
+
+class Message(Enum):
+    # Client to server: local player count, then the session name
+    JOIN = 0
+    # Server to client: index of the client's first player, tick, then a whole snapshot
+    WELCOME = 1
+    # Client to server: local player index, action
+    INPUT = 2
+    # Server to client: tick, KEYFRAME or DELTA, then the snapshot
+    UPDATE = 3
+    # Server to client: reason, after which the server hangs up
+    ERROR = 4
+    # Either way: empty from the client, server statistics as JSON in reply
+    STATS = 5
+
+KEYFRAME = 0
+DELTA = 1
+
+class ProtocolError(ValueError):
+    pass
+
+def encode(message: Message, payload: bytes = b"") -> bytes:
+    return HEADER.pack(message.value, len(payload)) + payload
+
+def decode_input(payload: bytes) -> Input:
+    player_index, action = INPUT.unpack(payload)
+    return player_index, Action(action)
+
+class DeltaEncoder:
+    def __init__(self, baseline: bytes):
+        self.baseline = baseline
+
+    def encode(self, data: bytes) -> tuple[int, bytes]:
+        # Compressed data, relative to the previous call's when the sizes match
+        baseline, self.baseline = self.baseline, data
+        if len(baseline) != len(data):
+            return KEYFRAME, zlib.compress(data, 1)
+        delta = np.bitwise_xor(np.frombuffer(baseline, np.uint8), np.frombuffer(data, np.uint8))
+        return DELTA, zlib.compress(delta.tobytes(), 1)
+
+class DeltaDecoder:
+    def __init__(self, baseline: bytes):
+        self.baseline = baseline
+
+    def decode(self, kind: int, payload: bytes) -> bytes:
+        data = zlib.decompress(payload)
+        if kind == DELTA:
+            if len(data) != len(self.baseline):
+                raise ProtocolError("delta does not match the previous snapshot")
+            data = np.bitwise_xor(np.frombuffer(self.baseline, np.uint8), np.frombuffer(data, np.uint8)).tobytes()
+        self.baseline = data
+        return data
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[Message, bytes]:
+    message, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"message of {length} bytes")
+    try:
+        return Message(message), await reader.readexactly(length)
+    except ValueError:
+        raise ProtocolError(f"unknown message type {message}")
+
+class Client:
+    # The thin client's connection. The socket blocks only while joining;
+    # after that poll() never waits, so it can run once per frame.
+    def __init__(self, host: str, port: int, session: str, player_count: int = 1, timeout: float = 5):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket.sendall(encode(Message.JOIN, JOIN.pack(player_count) + session.encode()))
+        self._buffer = bytearray()
+        self.connected = True
+        message, payload = self._receive()
+        if message is Message.ERROR:
+            raise ProtocolError(payload.decode())
+        if message is not Message.WELCOME:
+            raise ProtocolError(f"expected WELCOME, got {message.name}")
+        self.first_player, self.tick = WELCOME.unpack_from(payload)
+        self.snapshot = zlib.decompress(payload[WELCOME.size:])
+        self._decoder = DeltaDecoder(self.snapshot)
+        self.socket.setblocking(False)
+
+    def _receive(self) -> tuple[Message, bytes]:
+        while (message := self._next()) is None:
+            data = self.socket.recv(65536)
+            if not data:
+                raise ProtocolError("server closed the connection")
+            self._buffer += data
+        return message
+
+    def _next(self) -> Optional[tuple[Message, bytes]]:
+        # Raises ProtocolError, as the server does, for a message no client could read
+        if len(self._buffer) < HEADER.size:
+            return None
+        message, length = HEADER.unpack_from(self._buffer)
+        if length > MAX_PAYLOAD:
+            raise ProtocolError(f"message of {length} bytes")
+        if len(self._buffer) < HEADER.size + length:
+            return None
+        payload = bytes(self._buffer[HEADER.size:HEADER.size + length])
+        del self._buffer[:HEADER.size + length]
+        try:
+            return Message(message), payload
+        except ValueError:
+            raise ProtocolError(f"unknown message type {message}")
+
+    def send(self, inputs: list[Input]):
+        # Player indices are local to this client, from 0
+        if inputs and self.connected:
+            try:
+                self.socket.sendall(b"".join(encode(Message.INPUT, INPUT.pack(player_index, action.value))
+                                             for player_index, action in inputs))
+            except OSError:
+                self.connected = False
+
+    def poll(self) -> Optional[bytes]:
+        # The newest snapshot that arrived since the last call, if any. A
+        # message that cannot be read drops the connection.
+        latest = None
+        try:
+            while data := self.socket.recv(65536):
+                self._buffer += data
+            self.connected = False
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.connected = False
+        try:
+            while (message := self._next()) is not None:
+                message, payload = message
+                if message is Message.UPDATE:
+                    self.tick, kind = UPDATE.unpack_from(payload)
+                    latest = self.snapshot = self._decoder.decode(kind, payload[UPDATE.size:])
+                elif message is Message.ERROR:
+                    self.connected = False
+        except (ProtocolError, struct.error, zlib.error):
+            self.connected = False
+            self._buffer.clear()
+        return latest
+
+    def close(self):
+        self.socket.close()
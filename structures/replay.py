@@ -0,0 +1,104 @@
+import struct
+import sys
+import zlib
+from array import array
+from typing import Iterator, Optional
+
+from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
+from structures.game import Action, GameState, Input, Status, new_game, step
+from structures.level import DIGEST_SIZE, level_digest
+
+# File layout: header, the level path (empty for the built-in level), then a
+# zlib stream holding one uint16 dt per frame followed by the input records.
+# The header carries the level file's content hash (zeros for the built-in
+# level), so a replay of a level edited since is refused.
+MAGIC = b"MREP"
+VERSION = 2
+HEADER = struct.Struct(f"<4sBHIIBB{DIGEST_SIZE}s")
+BUILT_IN_DIGEST = bytes(DIGEST_SIZE)
+INPUT = struct.Struct("<IBB")
+
+class Recorder:
+    def __init__(self, level: Optional[str] = None, player_count: int = 2, pawn_count: int = 2):
+        self.level = level
+        self.digest = level_digest(level) if level else BUILT_IN_DIGEST
+        self.player_count = player_count
+        self.pawn_count = pawn_count
+        self.dts = array('H')
+        self.inputs = bytearray()
+
+    def record(self, inputs: list[Input], dt: int):
+        frame = len(self.dts)
+        self.dts.append(dt)
+        for player_index, action in inputs:
+            self.inputs += INPUT.pack(frame, player_index, action.value)
+
+    def to_bytes(self) -> bytes:
+        level = (self.level or "").encode()
+        dts = array('H', self.dts)
+        if sys.byteorder != "little":
+            dts.byteswap()
+        header = HEADER.pack(MAGIC, VERSION, len(level), len(self.dts), len(self.inputs) // INPUT.size,
+                             self.player_count, self.pawn_count, self.digest)
+        return header + level + zlib.compress(bytes(dts) + self.inputs, 9)
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+class Replay:
+    def __init__(self, level: Optional[str], dts: array, inputs: list[list[Input]], player_count: int = 2,
+                 pawn_count: int = 2, digest: bytes = BUILT_IN_DIGEST):
+        self.level = level
+        self.dts = dts
+        self.inputs = inputs
+        self.player_count = player_count
+        self.pawn_count = pawn_count
+        self.digest = digest
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Replay":
+        if data[:4] != MAGIC or data[4:5] != bytes([VERSION]):
+            raise ValueError("not a replay file or unsupported version")
+        _, _, level_size, frame_count, input_count, player_count, pawn_count, digest = HEADER.unpack_from(data)
+        level = data[HEADER.size:HEADER.size + level_size].decode() or None
+        body = zlib.decompress(data[HEADER.size + level_size:])
+        dts = array('H')
+        dts.frombytes(body[:2 * frame_count])
+        if sys.byteorder != "little":
+            dts.byteswap()
+        inputs = [[] for _ in range(frame_count)]
+        for frame, player_index, action in INPUT.iter_unpack(body[2 * frame_count:2 * frame_count + INPUT.size * input_count]):
+            inputs[frame].append((player_index, Action(action)))
+        return cls(level, dts, inputs, player_count, pawn_count, digest)
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    def frames(self) -> Iterator[tuple[list[Input], int]]:
+        return zip(self.inputs, self.dts)
+
+    def check_level(self):
+        # Raises ValueError when the level file is not the one recorded against
+        if self.level and level_digest(self.level) != self.digest:
+            raise ValueError(f"{self.level} has changed since the replay was recorded")
+
+    def new_game(self) -> GameState:
+        self.check_level()
+        return new_game(Board(BOARD_HEIGHT, BOARD_WIDTH, self.level), self.player_count, self.pawn_count)
+
+def run_headless(replay: Replay) -> GameState:
+    # Replays every frame as fast as possible, without a display
+    state = replay.new_game()
+    for inputs, dt in replay.frames():
+        step(state, inputs, dt)
+        if state.status is not Status.PLAYING:
+            break
+    return state
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        state = run_headless(Replay.load(path))
+        print(f"{path}: {state.status.name} at {state.time} ms, oxygen {state.oxygen:.2f}, pawns {len(state.pawns)}")
@@ -0,0 +1,81 @@
+from typing import Any, Hashable, Iterable
+
+import pygame
+from pygame import Rect, Surface
+
+from structures.board import Board
+from structures.camera import Camera
+from structures.cell import Cell
+
+class Scene:
+    # Holds the wall layer for the camera's viewport in one pre-rendered
+    # surface and collects the screen rectangles that changed since the last
+    # present(). The layer is rebuilt only when the camera scrolls, zooms or
+    # is resized, and then covers just the visible cells.
+    def __init__(self, board: Board, camera: Camera):
+        self.board = board
+        self.camera = camera
+        self.dirty: list[Rect] = []
+        self._tracked: dict[Hashable, tuple[Any, list[Rect]]] = {}
+        self._view = None
+        self.refresh()
+
+    def refresh(self) -> bool:
+        # Returns True when the camera's view changed, in which case the whole
+        # viewport is marked and everything tracked starts over
+        if self.camera.view == self._view:
+            return False
+        self._view = self.camera.view
+        self.background = self._render_walls()
+        self._tracked.clear()
+        self.mark(self.rect)
+        return True
+
+    def _render_walls(self) -> Surface:
+        camera = self.camera
+        background = pygame.Surface(camera.viewport.size)
+        offset = (-camera.viewport.x, -camera.viewport.y)
+        for x, y in camera.cells_in(camera.viewport):
+            walls = self.board.walls[self.board.cartesian_to_id(x, y)]
+            background.blit(camera.sprite(Cell.get_wall_image(walls)), camera.cell_rect(x, y).move(offset))
+        if pygame.display.get_surface() is not None:
+            background = background.convert()
+        return background
+
+    def redraw_walls(self, ids: Iterable[int]):
+        # Re-renders the wall layer under cells whose walls changed, and marks them
+        camera = self.camera
+        offset = (-camera.viewport.x, -camera.viewport.y)
+        for id in ids:
+            rect = self.cell_rect(*self.board.id_to_cartesian(id))
+            if rect.colliderect(camera.viewport):
+                self.background.blit(camera.sprite(Cell.get_wall_image(self.board.walls[id])), rect.move(offset))
+                self.mark(rect)
+
+    @property
+    def rect(self) -> Rect:
+        return self.camera.viewport
+
+    def cell_rect(self, x: int, y: int) -> Rect:
+        return self.camera.cell_rect(x, y)
+
+    def mark(self, rect: Rect):
+        self.dirty.append(Rect(rect))
+
+    def mark_cell(self, x: int, y: int):
+        self.dirty.append(self.cell_rect(x, y))
+
+    def track(self, key: Hashable, value: Any, rects: list[Rect]):
+        # Marks both the old and the new rectangles whenever value changes
+        previous = self._tracked.get(key)
+        if previous is not None and previous[0] == value:
+            return
+        if previous is not None:
+            self.dirty.extend(previous[1])
+        self.dirty.extend(rects)
+        self._tracked[key] = (value, rects)
+
+    def present(self):
+        if self.dirty:
+            pygame.display.update(self.dirty)
+            self.dirty = []
@@ -0,0 +1,71 @@
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Callable, Optional
+
+@dataclass
+class Timer:
+    # Game time in ms the callback is due at; interval is set for repeating timers
+    time: int
+    callback: Callable[[], None] = field(repr=False)
+    interval: Optional[int] = None
+    cancelled: bool = False
+
+class Scheduler:
+    # One-shot and repeating events on the game clock, kept in a heap by due
+    # time, so run() touches only the events that are due however many are
+    # waiting. Events due together fire in the order they were registered,
+    # which keeps every run deterministic for replays.
+    def __init__(self):
+        self._heap: list[tuple[int, int, Timer]] = []
+        self._sequence = count()
+
+    def _push(self, timer: Timer) -> Timer:
+        heapq.heappush(self._heap, (timer.time, next(self._sequence), timer))
+        return timer
+
+    def at(self, time: int, callback: Callable[[], None]) -> Timer:
+        return self._push(Timer(time, callback))
+
+    def every(self, interval: int, callback: Callable[[], None], start: int) -> Timer:
+        # Due at start, then every interval after it
+        if interval <= 0:
+            raise ValueError("a repeating timer needs a positive interval")
+        return self._push(Timer(start, callback, interval))
+
+    def cancel(self, timer: Timer):
+        # Cancelled timers stay in the heap and are dropped when they come up
+        timer.cancelled = True
+
+    @property
+    def next_due(self) -> Optional[int]:
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def run(self, now: int) -> int:
+        # Fires every event due by now and returns how many fired. A repeating
+        # timer fires at most once per run and is due again interval after its
+        # due time, so a timer left behind catches up one run at a time.
+        heap = self._heap
+        fired = 0
+        repeating = []
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+            if timer.cancelled:
+                continue
+            timer.callback()
+            fired += 1
+            if timer.interval is not None and not timer.cancelled:
+                timer.time += timer.interval
+                repeating.append(timer)
+        for timer in repeating:
+            self._push(timer)
+        return fired
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self) -> int:
+        return sum(not timer.cancelled for _, _, timer in self._heap)
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+import zlib
+from typing import Optional
+
+from structures import snapshot
+from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
+from structures.game import GameState, Input, Status, check_counts, new_game, step
+from structures.profiler import FrameProfiler
+from structures.protocol import (DEFAULT_PORT, INPUT, JOIN, UPDATE, WELCOME, DeltaEncoder, Message, ProtocolError,
+                                 decode_input, encode, read_message)
+from structures.timestep import DEFAULT_TICK_RATE, FixedTimestep
+
+# Updates go out every SEND_INTERVAL ticks (20 a second at 60 Hz)
+SEND_INTERVAL = 3
+# Clients that fall this far behind on reading are dropped rather than buffered for
+MAX_BACKLOG = 1 << 20
+
+class Session:
+    # One game and the clients playing it. All clients share one delta baseline,
+    # so each update is encoded once and the same bytes go to everyone.
+    def __init__(self, name: str, state: GameState):
+        self.name = name
+        self.state = state
+        self.clients: dict[asyncio.StreamWriter, int] = {}
+        self.pending: list[Input] = []
+        self.free_players = list(range(len(state.players)))
+        self.tick = 0
+        self.encoder = DeltaEncoder(snapshot.save(state))
+        self._buffer = bytearray(snapshot.size(state))
+
+    def join(self, writer: asyncio.StreamWriter, player_count: int) -> Optional[int]:
+        # The client's first player index; a client gets consecutive players
+        for index, first in enumerate(self.free_players):
+            if self.free_players[index:index + player_count] == list(range(first, first + player_count)):
+                del self.free_players[index:index + player_count]
+                self.clients[writer] = first
+                return first
+        return None
+
+    def leave(self, writer: asyncio.StreamWriter, player_count: int):
+        first = self.clients.pop(writer, None)
+        if first is not None:
+            self.free_players = sorted(self.free_players + list(range(first, first + player_count)))
+
+    def welcome(self, first: int) -> bytes:
+        # Carries the baseline the next update is relative to
+        return encode(Message.WELCOME, WELCOME.pack(first, self.tick) + zlib.compress(self.encoder.baseline, 1))
+
+    def update(self) -> bytes:
+        if len(self._buffer) != snapshot.size(self.state):
+            self._buffer = bytearray(snapshot.size(self.state))
+        snapshot.save_into(self.state, self._buffer)
+        kind, payload = self.encoder.encode(bytes(self._buffer))
+        return encode(Message.UPDATE, UPDATE.pack(self.tick, kind) + payload)
+
+class Server:
+    # Runs every session's rules on one shared fixed timestep, headless and
+    # authoritative: clients only send inputs and render what comes back.
+    def __init__(self, level: Optional[str] = None, player_count: int = 2, pawn_count: int = 2,
+                 tick_rate: int = DEFAULT_TICK_RATE, send_interval: int = SEND_INTERVAL):
+        # Every session plays on a copy, so the path tables are built only once
+        self.board = Board(BOARD_HEIGHT, BOARD_WIDTH, level)
+        check_counts(self.board.width, self.board.height, player_count, pawn_count)
+        self.player_count = player_count
+        self.pawn_count = pawn_count
+        self.timestep = FixedTimestep(tick_rate)
+        self.send_interval = send_interval
+        self.sessions: dict[str, Session] = {}
+        # One "frame" per tick: the time spent stepping every session and sending the updates
+        self.profiler = FrameProfiler()
+        self.bytes_sent = 0
+        self.started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    def _session(self, name: str) -> Session:
+        session = self.sessions.get(name)
+        if session is None:
+            session = Session(name, new_game(self.board.copy(), self.player_count, self.pawn_count))
+            self.sessions[name] = session
+        return session
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = None
+        player_count = 0
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                message, payload = await read_message(reader)
+                match message:
+                    case Message.JOIN if session is None:
+                        player_count, = JOIN.unpack_from(payload)
+                        name = payload[JOIN.size:].decode()
+                        candidate = self._session(name)
+                        first = candidate.join(writer, player_count)
+                        if first is None:
+                            if not candidate.clients:
+                                del self.sessions[name]
+                            writer.write(encode(Message.ERROR, f"session {name!r} has no room for {player_count} players".encode()))
+                            return
+                        session = candidate
+                        writer.write(session.welcome(first))
+                    case Message.INPUT if session is not None and len(payload) == INPUT.size:
+                        player_index, action = decode_input(payload)
+                        if player_index < player_count:
+                            session.pending.append((session.clients[writer] + player_index, action))
+                    case Message.STATS:
+                        writer.write(encode(Message.STATS, json.dumps(self.stats()).encode()))
+                    case _:
+                        raise ProtocolError(f"unexpected {message.name}")
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError, UnicodeDecodeError, ValueError):
+            pass
+        finally:
+            if session is not None:
+                session.leave(writer, player_count)
+                if not session.clients:
+                    self.sessions.pop(session.name, None)
+            writer.close()
+
+    def tick(self, dt: int):
+        profiler = self.profiler
+        profiler.begin_frame()
+        for session in list(self.sessions.values()):
+            if session.state.status is not Status.PLAYING:
+                continue
+            with profiler.phase("step"):
+                inputs, session.pending = session.pending, []
+                step(session.state, inputs, dt)
+                session.tick += 1
+            # Sessions send on their own phase of the interval, and a finished game at once
+            if session.tick % self.send_interval == 0 or session.state.status is not Status.PLAYING:
+                with profiler.phase("send"):
+                    update = session.update()
+                    for writer in list(session.clients):
+                        if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                            writer.close()
+                            continue
+                        writer.write(update)
+                        self.bytes_sent += len(update)
+        profiler.end_frame()
+
+    async def run(self):
+        timestep = self.timestep
+        start = time.perf_counter()
+        clock = 0
+        while True:
+            now = int((time.perf_counter() - start) * 1000)
+            for dt in timestep.advance(now - clock):
+                self.tick(dt)
+            clock = now
+            # Until the next tick is due
+            await asyncio.sleep(timestep.tick_length(timestep.ticks) * (1 - timestep.alpha) / 1000)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run())
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "clients": sum(len(session.clients) for session in self.sessions.values()),
+            "ticks": self.timestep.ticks,
+            "dropped_ticks": self.timestep.dropped,
+            "uptime": time.perf_counter() - self.started,
+            "cpu_seconds": time.process_time() - self._cpu_started,
+            "bytes_sent": self.bytes_sent,
+            "tick_ms": self.profiler.percentiles("frame"),
+            "step_ms": self.profiler.percentiles("step"),
+            "send_ms": self.profiler.percentiles("send"),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host co-op sessions for thin clients (MINER_SERVER=host:port python main.py)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--level", help="level file (default: the built-in level)")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--pawns", type=int, default=2)
+    parser.add_argument("--tick-rate", type=int, default=DEFAULT_TICK_RATE)
+    parser.add_argument("--send-interval", type=int, default=SEND_INTERVAL, help="ticks between state updates")
+    args = parser.parse_args()
+    try:
+        server = Server(args.level, args.players, args.pawns, args.tick_rate, args.send_interval)
+    except ValueError as error:
+        parser.error(str(error))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
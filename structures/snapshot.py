@@ -0,0 +1,165 @@
+import struct
+import sys
+
+import numpy as np
+
+from structures.board import Board
+from structures.cell import Objective
+from structures.direction import Direction
+from structures.enemy import Enemy
+from structures.game import PAWN_COLORS, GameState, Status, new_game, schedule_timers
+from structures.level import Level
+from structures.pawn import Pawn
+from structures.player import Player
+
+# Layout: header, one record per pawn, player and enemy, then the walls and
+# objectives (one byte per cell) and the fog as little-endian float32, row by
+# row. Occupancy, spawners and the flow field are rebuilt from these on restore.
+# A player's movement is a bitmask of 1 << Direction.value.
+MAGIC = b"MSNP"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHBBHddqqBBB")
+PAWN = struct.Struct("<HHB")
+PLAYER = struct.Struct("<BB")
+ENEMY = struct.Struct("<HHBq")
+
+_FOG = np.dtype("<f4")
+
+def size(state: GameState) -> int:
+    cells = state.board.width * state.board.height
+    return (HEADER.size + PAWN.size * len(state.pawns) + PLAYER.size * len(state.players)
+            + ENEMY.size * len(state.enemies) + cells * (2 + _FOG.itemsize))
+
+def save_into(state: GameState, buffer: bytearray | memoryview, offset: int = 0) -> int:
+    # Writes the snapshot into a caller-owned buffer, so a ring of them can be
+    # reused frame after frame; returns the number of bytes written
+    board = state.board
+    cells = board.width * board.height
+    start = offset
+    HEADER.pack_into(buffer, offset, MAGIC, VERSION, board.width, board.height, len(state.players), len(state.pawns),
+                     len(state.enemies), state.oxygen, state.signal, state.time, state.next_spawn,
+                     state.status.value, state.exit_open, state.on_plates)
+    offset += HEADER.size
+    for pawn in state.pawns:
+        PAWN.pack_into(buffer, offset, pawn.x, pawn.y, PAWN_COLORS.index(pawn.color))
+        offset += PAWN.size
+    for player in state.players:
+        PLAYER.pack_into(buffer, offset, player.pawn_index,
+                         sum(1 << direction.value for direction in player.possible_movement))
+        offset += PLAYER.size
+    for enemy in state.enemies:
+        ENEMY.pack_into(buffer, offset, enemy.x, enemy.y, enemy.enabled, enemy.last_move_tick)
+        offset += ENEMY.size
+    view = memoryview(buffer)
+    view[offset:offset + cells] = board.walls
+    view[offset + cells:offset + 2 * cells] = board.objectives
+    offset += 2 * cells
+    fog = np.frombuffer(view[offset:offset + cells * _FOG.itemsize], _FOG).reshape(board.height, board.width)
+    fog[...] = state.fog
+    return offset + fog.nbytes - start
+
+def save(state: GameState) -> bytes:
+    buffer = bytearray(size(state))
+    save_into(state, buffer)
+    return bytes(buffer)
+
+def _header(data: bytes | bytearray | memoryview, offset: int) -> tuple:
+    if bytes(data[offset:offset + 4]) != MAGIC or data[offset + 4] != VERSION:
+        raise ValueError("not a snapshot or unsupported version")
+    return HEADER.unpack_from(data, offset)
+
+def restore(state: GameState, data: bytes | bytearray | memoryview, offset: int = 0):
+    # Puts state back to the snapshot in place, for rollback and restarts. The
+    # board keeps its identity; its paths are rebuilt only if the walls differ,
+    # and cells whose objective differs are reported through changed_cells.
+    (_, _, width, height, player_count, pawn_count, enemy_count, oxygen, signal, time, next_spawn,
+     status, exit_open, on_plates) = _header(data, offset)
+    board = state.board
+    if (width, height) != (board.width, board.height):
+        raise ValueError(f"snapshot is of a {width}x{height} board, not {board.width}x{board.height}")
+    cells = width * height
+    offset += HEADER.size
+
+    pawns = []
+    for _ in range(pawn_count):
+        x, y, color = PAWN.unpack_from(data, offset)
+        pawns.append(Pawn(x, y, PAWN_COLORS[color]))
+        offset += PAWN.size
+    # Players hold on to the state's pawn list, so it is refilled in place
+    state.pawns[:] = pawns
+    del state.players[player_count:]
+    for index in range(player_count):
+        pawn_index, movement = PLAYER.unpack_from(data, offset)
+        possible_movement = {direction for direction in Direction if movement & 1 << direction.value}
+        if index < len(state.players):
+            state.players[index].pawn_index = pawn_index
+            state.players[index].possible_movement = possible_movement
+        else:
+            state.players.append(Player(pawn_index, state.pawns, possible_movement))
+        offset += PLAYER.size
+    enemies = []
+    for _ in range(enemy_count):
+        x, y, enabled, last_move_tick = ENEMY.unpack_from(data, offset)
+        enemies.append(Enemy(x, y, bool(enabled), last_move_tick))
+        offset += ENEMY.size
+    state.enemies[:] = enemies
+
+    # Compared bytearray first: that is a memcmp, the other way round goes item by item
+    view = memoryview(data)
+    walls = view[offset:offset + cells]
+    if board.walls != walls:
+        board.walls[:] = walls
+        board.rebuild_paths()
+        if state.flow is not None:
+            state.flow.invalidate()
+    objectives = view[offset + cells:offset + 2 * cells]
+    if board.objectives != objectives:
+        changed = np.frombuffer(objectives, np.uint8) != np.frombuffer(board.objectives, np.uint8)
+        state.changed_cells.update(board.id_to_cartesian(int(id)) for id in np.flatnonzero(changed))
+        board.objectives[:] = objectives
+        board.reindex()
+    offset += 2 * cells
+    fog = np.frombuffer(view[offset:offset + cells * _FOG.itemsize], _FOG).reshape(height, width)
+    if state.fog.shape == fog.shape:
+        state.fog[...] = fog
+    else:
+        state.fog = fog.astype(np.float32)
+
+    board.clear_occupancy()
+    for pawn in state.pawns:
+        board.occupy(board.cartesian_to_id(pawn.x, pawn.y))
+    # Placing the pawns fires the board's triggers, but nobody stepped anywhere
+    state.entered_tanks.clear()
+    state.spawners[:] = board.cells_with(Objective.ENEMY_SPAWNER)
+    state.oxygen = oxygen
+    state.signal = signal
+    state.time = time
+    state.next_spawn = next_spawn
+    state.status = Status(status)
+    state.exit_open = bool(exit_open)
+    state.on_plates = bool(on_plates)
+    schedule_timers(state)
+
+def level(data: bytes | bytearray | memoryview, offset: int = 0) -> Level:
+    # The board's walls and objectives as they were when the snapshot was taken
+    _, _, width, height, player_count, pawn_count, enemy_count, *_ = _header(data, offset)
+    cells = width * height
+    walls = offset + HEADER.size + PAWN.size * pawn_count + PLAYER.size * player_count + ENEMY.size * enemy_count
+    if len(data) < walls + 2 * cells:
+        raise ValueError("snapshot is truncated")
+    return Level(width, height, bytes(data[walls:walls + cells]), bytes(data[walls + cells:walls + 2 * cells]))
+
+def load(data: bytes | bytearray | memoryview, offset: int = 0) -> GameState:
+    # A new game on a board of its own
+    _, _, _, _, player_count, pawn_count, *_ = _header(data, offset)
+    state = new_game(Board.from_level(level(data, offset)), player_count, max(pawn_count, 1))
+    restore(state, data, offset)
+    state.changed_cells.clear()
+    return state
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        with open(path, "rb") as file:
+            state = load(file.read())
+        print(f"{path}: {state.status.name} at {state.time} ms, oxygen {state.oxygen:.2f}, pawns {len(state.pawns)}, "
+              f"enemies {len(state.enemies)}")
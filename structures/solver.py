@@ -0,0 +1,255 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from structures.board import Board, BOARD_HEIGHT, BOARD_WIDTH
+from structures.cell import Objective
+from structures.direction import Direction
+from structures.game import MAX_OXYGEN, OXYGEN_DRAIN, OXYGEN_TANK_REFILL, PLAYER_MOVEMENT, start_positions
+
+# Game time one key press is assumed to take, for the oxygen estimate
+MOVE_TIME = 250
+# The search gives up (and reports the level as undecided) after this many states
+MAX_STATES = 1_000_000
+
+@dataclass
+class Solution:
+    solvable: bool
+    # Pawn moves in the shortest solution
+    moves: Optional[int]
+    # Lowest oxygen level along that solution
+    oxygen_margin: Optional[float]
+    states: int
+    # False when MAX_STATES ran out before the search was decided
+    complete: bool
+
+# Per search state: tanks used (bitmask), oxygen now, lowest oxygen so far
+Label = tuple[int, float, float]
+
+class Solver:
+    # Breadth-first search over joint states, one pawn move per layer, so the
+    # first layer with a win gives the minimal move count. A plain search
+    # without oxygen runs first and settles unsolvable levels cheaply.
+    #
+    # Rotating costs no game time and every player may pick any pawn, so a
+    # pawn can move along any axis some player steers; which pawn a player
+    # holds, and which pawn is which, does not matter. A state is therefore
+    # the sorted pawn cells plus the exit flag, packed into one int with a
+    # fixed-width field per pawn (size marks a pawn that has left). Tanks and
+    # oxygen ride along as labels: a state keeps every label not beaten by
+    # another one that used a subset of the tanks with at least as much oxygen.
+    # The enemy is not modelled.
+    def __init__(self, board: Board, player_count: int = 2, pawn_count: int = 2, move_time: int = MOVE_TIME):
+        self.board = board
+        self.size = board.width * board.height
+        self.pawn_count = pawn_count
+        self.drain = OXYGEN_DRAIN * move_time / 1000
+        directions = set().union(*(PLAYER_MOVEMENT[player % len(PLAYER_MOVEMENT)] for player in range(player_count)))
+        self.neighbors = [self._neighbors(direction) for direction in Direction if direction in directions]
+
+        objectives = board.objectives
+        self.tank_bits = {id: 1 << bit for bit, id in
+                          enumerate(id for id, objective in enumerate(objectives) if objective == Objective.OXYGEN_TANK.value)}
+        self.plates = frozenset(id for id, objective in enumerate(objectives) if objective == Objective.PRESSURE_PLATE.value)
+        self.exits = frozenset(id for id, objective in enumerate(objectives) if objective == Objective.EXIT.value)
+        self.position_bits = self.size.bit_length()
+        self.exit_bit = 1 << (self.position_bits * pawn_count)
+
+    def _neighbors(self, direction: Direction) -> list[int]:
+        # The cell a pawn reaches moving in direction, or -1 when it cannot
+        board = self.board
+        offset = Direction.get_coordinate_offset(direction)
+        neighbors = []
+        for id in range(self.size):
+            x, y = board.id_to_cartesian(id)
+            new_x, new_y = x + offset.x, y + offset.y
+            open = board.in_bounds(new_x, new_y) and board.is_open(id, direction)
+            neighbors.append(board.cartesian_to_id(new_x, new_y) if open else -1)
+        return neighbors
+
+    def pack(self, positions: list[int], exit_open: bool) -> int:
+        state = 0
+        for position in sorted(positions, reverse=True):
+            state = state << self.position_bits | position
+        return state | (self.exit_bit if exit_open else 0)
+
+    def unpack(self, state: int) -> tuple[list[int], bool]:
+        mask = (1 << self.position_bits) - 1
+        positions = [state >> (slot * self.position_bits) & mask for slot in range(self.pawn_count)]
+        return positions, bool(state & self.exit_bit)
+
+    def start(self) -> int:
+        board = self.board
+        cells, _ = start_positions(board.width, board.height, self.pawn_count)
+        return self.pack([board.cartesian_to_id(x, y) for x, y in cells], False)
+
+    def _moves(self, positions: list[int]) -> list[list[int]]:
+        # Pawn cells after every possible single pawn move
+        occupied = set(positions)
+        results = []
+        for slot, position in enumerate(positions):
+            if position == self.size:
+                continue
+            for neighbors in self.neighbors:
+                target = neighbors[position]
+                if target != -1 and target not in occupied:
+                    moved = positions.copy()
+                    moved[slot] = target
+                    results.append(moved)
+        return results
+
+    def _settle(self, positions: list[int], exit_open: bool) -> tuple[list[int], bool, bool]:
+        # Applies the plate and exit rules of game.step after a pawn moved; returns whether that won
+        present = [position for position in positions if position != self.size]
+        if all(position in self.plates for position in present):
+            exit_open = True
+        if exit_open and any(position in self.exits for position in present):
+            positions = [self.size if position in self.exits else position for position in positions]
+            return positions, exit_open, all(position == self.size for position in positions)
+        return positions, exit_open, False
+
+    def _pick_up(self, positions: list[int], tanks: int, oxygen: float) -> tuple[int, float]:
+        for position in positions:
+            bit = self.tank_bits.get(position)
+            if bit is not None and not tanks & bit:
+                tanks |= bit
+                oxygen = min(oxygen + OXYGEN_TANK_REFILL, MAX_OXYGEN)
+        return tanks, oxygen
+
+    def depths(self, max_states: int = MAX_STATES) -> tuple[dict[int, int], Optional[int]]:
+        # Plain BFS ignoring oxygen: the move count at which each state is first
+        # reached, and the minimal move count of a win (None when there is none)
+        start = self.start()
+        depths = {start: 0}
+        layer = [start]
+        moves = 0
+        while layer and len(depths) <= max_states:
+            moves += 1
+            next_layer = []
+            for state in layer:
+                positions, exit_open = self.unpack(state)
+                for moved in self._moves(positions):
+                    moved, next_exit_open, won = self._settle(moved, exit_open)
+                    if won:
+                        return depths, moves
+                    next_state = self.pack(moved, next_exit_open)
+                    if next_state not in depths:
+                        depths[next_state] = moves
+                        next_layer.append(next_state)
+            layer = next_layer
+        return depths, None
+
+    @staticmethod
+    def _dominated(label: Label, labels: list[Label]) -> bool:
+        tanks, oxygen, low = label
+        return any(other_tanks & tanks == other_tanks and other_oxygen >= oxygen and other_low >= low
+                   for other_tanks, other_oxygen, other_low in labels)
+
+    def search(self, max_states: int = MAX_STATES, depths: Optional[dict[int, int]] = None) -> Solution:
+        # The search with tanks and oxygen. Given the depths of the plain BFS,
+        # only states on a shortest path are followed, which is far cheaper
+        # when one of those paths has enough oxygen.
+        start = self.start()
+        seen: dict[int, list[Label]] = {start: [(0, MAX_OXYGEN, MAX_OXYGEN)]}
+        layer = {start: seen[start]}
+        labels = 1
+        moves = 0
+        while layer:
+            moves += 1
+            next_layer: dict[int, list[Label]] = {}
+            best_win = None
+            for state, state_labels in layer.items():
+                positions, exit_open = self.unpack(state)
+                for tanks, oxygen, low in state_labels:
+                    oxygen -= self.drain
+                    if oxygen < 0:
+                        continue
+                    for moved in self._moves(positions):
+                        next_tanks, next_oxygen = self._pick_up(moved, tanks, oxygen)
+                        next_low = min(low, next_oxygen)
+                        moved, next_exit_open, won = self._settle(moved, exit_open)
+                        if won:
+                            best_win = next_low if best_win is None else max(best_win, next_low)
+                            continue
+                        next_state = self.pack(moved, next_exit_open)
+                        label = (next_tanks, next_oxygen, next_low)
+                        if depths is not None and depths.get(next_state) != moves:
+                            continue
+                        kept = seen.setdefault(next_state, [])
+                        if not self._dominated(label, kept):
+                            kept.append(label)
+                            next_layer.setdefault(next_state, []).append(label)
+            if best_win is not None:
+                return Solution(True, moves, best_win, labels, True)
+            labels += sum(len(state_labels) for state_labels in next_layer.values())
+            if labels > max_states:
+                return Solution(False, None, None, labels, False)
+            layer = next_layer
+        return Solution(False, None, None, labels, True)
+
+    def solve(self, max_states: int = MAX_STATES) -> Solution:
+        depths, moves = self.depths(max_states)
+        if moves is None:
+            return Solution(False, None, None, len(depths), len(depths) <= max_states)
+        solution = self.search(max_states, depths)
+        if solution.solvable:
+            return solution
+        # No shortest path has enough oxygen; look at the longer ones too
+        return self.search(max_states)
+
+def solve_level(path: Optional[str], player_count: int = 2, pawn_count: int = 2, move_time: int = MOVE_TIME,
+                max_states: int = MAX_STATES) -> Solution:
+    return Solver(Board(BOARD_HEIGHT, BOARD_WIDTH, path), player_count, pawn_count, move_time).solve(max_states)
+
+def _solve_job(job: tuple) -> tuple[str, Optional[Solution], Optional[str]]:
+    path, *arguments = job
+    try:
+        return path, solve_level(path, *arguments), None
+    except (OSError, ValueError) as error:
+        return path, None, str(error)
+
+def _level_paths(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if os.path.isfile(os.path.join(path, name)))
+        else:
+            files.append(path)
+    return files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that levels can be finished, and with how much oxygen to spare")
+    parser.add_argument("paths", nargs="*", help="level files or directories of them (default: the built-in level)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--pawns", type=int, default=2)
+    parser.add_argument("--move-time", type=int, default=MOVE_TIME, help="ms of game time per key press")
+    parser.add_argument("--min-margin", type=float, default=0, help="reject levels whose oxygen margin is below this")
+    parser.add_argument("--max-states", type=int, default=MAX_STATES)
+    args = parser.parse_args()
+
+    paths = _level_paths(args.paths) or [None]
+    jobs = [(path, args.players, args.pawns, args.move_time, args.max_states) for path in paths]
+    rejected = 0
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for path, solution, error in pool.map(_solve_job, jobs):
+            name = path or "<built-in>"
+            if error is not None:
+                print(f"{name}: error: {error}")
+                rejected += 1
+            elif not solution.complete:
+                print(f"{name}: UNDECIDED after {solution.states} states")
+                rejected += 1
+            elif not solution.solvable:
+                print(f"{name}: UNSOLVABLE ({solution.states} states)")
+                rejected += 1
+            else:
+                tight = solution.oxygen_margin < args.min_margin
+                print(f"{name}: {solution.moves} moves, oxygen margin {solution.oxygen_margin:.2f}"
+                      f"{' TOO TIGHT' if tight else ''} ({solution.states} states)")
+                rejected += tight
+    sys.exit(1 if rejected else 0)
@@ -0,0 +1,63 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from structures.game import GameState
+
+DEFAULT_TICK_RATE = 60
+# Ticks run at most this many times per frame; any further backlog is dropped,
+# so a long stall slows the game down instead of freezing it in catch-up
+MAX_TICKS_PER_FRAME = 5
+
+class FixedTimestep:
+    # Turns variable frame times into a whole number of fixed-length game
+    # ticks. Time is kept in integer units of 1/tick_rate ms, so the tick
+    # lengths handed out (e.g. 17, 17, 16 ms at 60 Hz) add up exactly.
+    def __init__(self, tick_rate: int = DEFAULT_TICK_RATE, max_ticks: int = MAX_TICKS_PER_FRAME):
+        self.tick_rate = tick_rate
+        self.max_ticks = max_ticks
+        self.ticks = 0
+        self.dropped = 0
+        self._accumulator = 0
+
+    def tick_length(self, tick: int) -> int:
+        return (tick + 1) * 1000 // self.tick_rate - tick * 1000 // self.tick_rate
+
+    def advance(self, elapsed: int) -> list[int]:
+        # Returns the length in ms of every tick due after elapsed ms of real time
+        self._accumulator += elapsed * self.tick_rate
+        due = self._accumulator // 1000
+        if due > self.max_ticks:
+            self.dropped += due - self.max_ticks
+            self._accumulator -= (due - self.max_ticks) * 1000
+            due = self.max_ticks
+        self._accumulator -= due * 1000
+        lengths = [self.tick_length(tick) for tick in range(self.ticks, self.ticks + due)]
+        self.ticks += due
+        return lengths
+
+    @property
+    def alpha(self) -> float:
+        # How far real time has moved into the next tick, from 0 to 1
+        return self._accumulator / 1000
+
+@dataclass
+class Snapshot:
+    # The continuously changing parts of a state, kept for interpolation
+    oxygen: float
+    signal: float
+    fog: np.ndarray
+
+def capture(state: GameState) -> Snapshot:
+    return Snapshot(state.oxygen, state.signal, state.fog.copy())
+
+def interpolate(previous: Snapshot, state: GameState, alpha: float) -> GameState:
+    # A shallow copy of state for drawing, with oxygen, signal and fog blended
+    # between the previous tick and the current one. Positions are whole cells
+    # and are not blended.
+    return replace(
+        state,
+        oxygen=previous.oxygen + (state.oxygen - previous.oxygen) * alpha,
+        signal=previous.signal + (state.signal - previous.signal) * alpha,
+        fog=previous.fog + (state.fog - previous.fog) * np.float32(alpha),
+    )